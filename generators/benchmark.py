@@ -0,0 +1,206 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import count
+
+import connector
+from db_data_generators.fake_arango import FakeArango
+from db_data_generators.generators import *
+from db_data_generators.parallel import generate_parallel
+from db_data_generators.pipeline import assign_keys
+from db_data_generators.writers import AsyncBatchWriter, BatchWriter
+
+SIZES = [1000, 10000]
+LATENCY = 0.002
+BASELINE = 'benchmark_baseline.json'
+# A case regresses when it gets slower, or needs more round trips or memory, by more than this share
+TOLERANCE = 0.2
+
+# The timetable reads doctors and appointments through pyArango, which the fake server can not answer
+generators = {
+    'staff': generate_staff,
+    'visitors_patients': generate_visitors_patients,
+    'tips': generate_tips,
+    'appointments': generate_appointments,
+    'home_remedies': generate_home_remedies,
+    'leave_applies': generate_leave_applies,
+    'facilities': generate_facilities,
+}
+
+
+# The record producers behind the generators, for the memory a row takes
+producers = {
+    'staff': staff_records,
+    'visitors_patients': visitor_patient_records,
+    'tips': tip_records,
+    'appointments': appointment_records,
+    'home_remedies': home_remedy_records,
+    'leave_applies': leave_apply_records,
+    'facilities': facility_records,
+}
+MEMORY_ROWS = 2000
+
+# Seconds `import generator` may take in a fresh interpreter, and the modules it has to leave to the stages
+IMPORT_BUDGET = 0.05
+LAZY_MODULES = ['numpy', 'pandas', 'faker', 'tqdm', 'requests', 'pyArango.connection']
+
+
+def make_writer(url, batch_size, mode, concurrency=None, chunk=None):
+    if concurrency is not None:
+        return AsyncBatchWriter(url, 'Clinic', batch_size=batch_size, mode=mode, concurrency=concurrency)
+    return BatchWriter(url, 'Clinic', batch_size=batch_size, mode=mode)
+
+
+def run_case(name, size, url, batch_size, mode, concurrency=None):
+    # Runs in a fresh process, so peak RSS and the caches belong to this case alone
+    connector.set_offline()
+    writer_factory = partial(make_writer, url, batch_size, mode, concurrency)
+    args = ()
+    if name in ('appointments', 'leave_applies'):
+        staff, _ = generate_parallel(generate_staff, writer_factory, 300, processes=1)
+        if name == 'appointments':
+            patients, _ = generate_parallel(generate_visitors_patients, writer_factory, 10000, processes=1)
+            args = (patients, staff.where("designation", "doctor"))
+        else:
+            args = (staff,)
+    # Build the value pools, the gazetteer and its spatial index outside of the measurement
+    get_pools()
+    get_gazetteer().hotspots()
+    get_gazetteer().row('', '')
+
+    start = time.perf_counter()
+    _, reports = generate_parallel(generators[name], writer_factory, size, *args, processes=1)
+    elapsed = time.perf_counter() - start
+    rows = sum(report.size for report in reports)
+    bytes_per_row = row_bytes(producers[name], min(size, MEMORY_ROWS), *args)
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed,
+        # Every batch report is one request
+        'round_trips_per_row': len(reports) / rows if rows else 0.0,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'bytes_per_row': bytes_per_row,
+    }
+
+
+def row_bytes(producer, n, *args):
+    # Memory held by n records with their keys, as they wait in the pipeline queue and the writer buffers
+    stage = assign_keys(map(str, count()).__next__)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = [stage(record) for record in producer(*args, n=n)]
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return used / len(records)
+
+
+def import_time(module='generator', repeat=5):
+    # Best time of importing module in repeat fresh interpreters, and the LAZY_MODULES it imported
+    code = (f'import sys, time\nstart = time.perf_counter()\nimport {module}\nprint(time.perf_counter() - start)\n'
+            f'print(*[name for name in {LAZY_MODULES!r} if name in sys.modules])')
+    best = float('inf')
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        seconds, imported = output.split('\n')[:2]
+        best = min(best, float(seconds))
+    return best, imported.split()
+
+
+def regressions(result, baseline, tolerance=TOLERANCE):
+    found = []
+    if result['rows_per_sec'] < baseline['rows_per_sec'] * (1 - tolerance):
+        found.append('rows/s')
+    if result['round_trips_per_row'] > baseline['round_trips_per_row'] * (1 + tolerance):
+        found.append('round trips')
+    if result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        found.append('memory')
+    if result.get('bytes_per_row', 0) > baseline.get('bytes_per_row', float('inf')) * (1 + tolerance):
+        found.append('bytes/row')
+    return found
+
+
+def change(value, base):
+    return f'{(value / base - 1) * 100:+.0f}%' if base else ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the generators against a fake ArangoDB server.')
+    parser.add_argument('--only', action='append', metavar='COLLECTION', choices=list(generators))
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--latency', type=float, default=LATENCY, help='seconds added to every request')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--mode', choices=('import', 'document'), default='import')
+    parser.add_argument('--concurrency', type=int, metavar='N', help='use the async writer with N requests in flight')
+    parser.add_argument('--baseline', default=BASELINE, help='results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                        help='seconds importing generator.py may take')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    results = {}
+    failed = []
+    seconds, imported = import_time()
+    line = f'import generator: {seconds * 1000:.0f} ms of {args.import_budget * 1000:.0f} ms'
+    if seconds > args.import_budget:
+        line += '  OVER BUDGET'
+    if imported:
+        line += f'  IMPORTS {", ".join(imported)}'
+    if seconds > args.import_budget or imported:
+        failed.append('import')
+    print(line)
+    print(f'{"case":<26}{"rows/s":>10}{"trips/row":>11}{"RSS MB":>9}{"B/row":>8}   vs baseline')
+    context = multiprocessing.get_context('spawn')
+    with FakeArango(latency=args.latency) as server:
+        for name in args.only or generators:
+            for size in args.sizes:
+                case = f'{name}@{size}'
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    result = executor.submit(run_case, name, size, server.url, args.batch_size, args.mode,
+                                             args.concurrency).result()
+                results[case] = result
+
+                line = (f'{case:<26}{result["rows_per_sec"]:>10.0f}{result["round_trips_per_row"]:>11.4f}'
+                        f'{result["peak_rss_mb"]:>9.1f}{result["bytes_per_row"]:>8.0f}')
+                base = baseline.get(case)
+                if base is not None:
+                    line += (f'   {change(result["rows_per_sec"], base["rows_per_sec"])} rows/s, '
+                             f'{change(result["round_trips_per_row"], base["round_trips_per_row"])} trips, '
+                             f'{change(result["peak_rss_mb"], base["peak_rss_mb"])} RSS')
+                    if 'bytes_per_row' in base:
+                        line += f', {change(result["bytes_per_row"], base["bytes_per_row"])} B/row'
+                    found = regressions(result, base, args.tolerance)
+                    if found:
+                        line += '  REGRESSION: ' + ', '.join(found)
+                        failed.append(case)
+                print(line)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'Saved {len(results)} results to {args.baseline}')
+    if failed:
+        print(f'{len(failed)} of {len(results)} cases regressed', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
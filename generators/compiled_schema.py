@@ -0,0 +1,158 @@
+import re
+import time
+from datetime import date, datetime
+
+import pyArango.validation as val
+
+import instrumentation
+from validators import DatetimePastVal, DatetimeVal, InvalidDocument, SSNVal, ValidationError
+
+_ssn = re.compile(r'\d\d\d-\d\d-\d\d\d\d')
+# The pattern of val.Email, [A-z] and all
+_email = re.compile(r'^[A-z0-9._-]+@[A-z0-9.-]+\.[A-z]{2,4}$')
+
+_compiled = {}
+
+
+class CompiledSchema:
+    """The validators of a collection class's _fields turned into plain checks.
+
+    A check returns None or the message the validator would raise. validate() gives the errors of one
+    document like validators.validate_document. Validators that have no compiled form (uniqueness,
+    references, ...) are called as they are, and anything they raise becomes the error of the field.
+    With metrics enabled the compiled checks are timed under the names instrument_validators gives the
+    validators they replace.
+    """
+
+    def __init__(self, collection_class):
+        self.name = collection_class.__name__
+        self.fields = [(name, [_compile(validator, f'validate.{self.name}.{name}')
+                               for validator in field.validators])
+                       for name, field in collection_class._fields.items()]
+
+    def validate(self, document):
+        errors = {}
+        for name, checks in self.fields:
+            if name in document:
+                value = document[name]
+                for check in checks:
+                    message = check(value)
+                    if message is not None:
+                        errors[name] = message
+                        break
+        return errors
+
+
+def compile_schema(collection_class):
+    schema = _compiled.get(collection_class)
+    if schema is None:
+        schema = _compiled[collection_class] = CompiledSchema(collection_class)
+    return schema
+
+
+def validate_compiled(collection_class, document):
+    # validators.validate_document through the compiled schema
+    errors = compile_schema(collection_class).validate(document)
+    if errors:
+        raise InvalidDocument(errors)
+    return True
+
+
+def _error(message):
+    # The message as the validator's ValidationError puts it
+    return str(ValidationError(message))
+
+
+def _compile(validator, name):
+    """The check of one validator of the field `name`, timed when metrics are enabled."""
+    if isinstance(validator, type):
+        # A validator class given instead of an instance, as in LeaveApply
+        validator = validator()
+    check, compiled = _compile_check(validator)
+    if compiled and instrumentation.metrics.enabled:
+        # The validators that are still called are timed by instrument_validators already
+        return _timed(f'{name}.{type(validator).__name__}', check)
+    return check
+
+
+def _timed(name, check):
+    # Like instrumentation.timed, with the values the check rejects counted as errors
+    def wrapper(value):
+        start = time.perf_counter()
+        message = check(value)
+        instrumentation.metrics.observe(name, time.perf_counter() - start, error=message is not None)
+        return message
+    return wrapper
+
+
+def _compile_check(validator):
+    # (check, whether the validator has a compiled form)
+    kind = type(validator)
+    if kind is val.NotNull:
+        def check(value):
+            if (value is None or (validator.reject_zero and value == 0 and type(value) is not bool)
+                    or (validator.reject_empty_string and value == "")):
+                return _error(f"Field can't have a null value, got: '{value}'")
+    elif kind is val.Email:
+        def check(value):
+            if not isinstance(value, str) or _email.match(value) is None:
+                return _error(f'The email address: {value} is invalid')
+    elif kind is val.Bool:
+        def check(value):
+            if not isinstance(value, bool):
+                return _error(f'{value} is not a valid boolean')
+    elif kind is val.Int:
+        def check(value):
+            if not isinstance(value, int):
+                return _error(f'{value} is not a valid integer')
+    elif kind is val.String:
+        def check(value):
+            if not isinstance(value, str):
+                return _error(f'{value} is not a valid string')
+    elif kind is val.Enumeration:
+        allowed = validator.allowed
+
+        def check(value):
+            try:
+                if value in allowed:
+                    return None
+            except TypeError:
+                pass
+            return _error(f'{value} is not among the allowed values {allowed}')
+    elif kind is SSNVal:
+        def check(value):
+            if not isinstance(value, str) or _ssn.search(value) is None:
+                return _error('SSN should be formatted as 123-45-6789')
+    elif kind is DatetimeVal:
+        return _date_check(past=False), True
+    elif kind is DatetimePastVal:
+        return _date_check(past=True), True
+    else:
+        def check(value):
+            try:
+                validator.validate(value)
+            except ValidationError as e:
+                return str(e)
+            except Exception as e:
+                # A value of the wrong type (an address that is not a dict, ...) that the validator trips over
+                return _error(f'{value!r} is not valid: {e}')
+        return check, False
+    return check, True
+
+
+def _date_check(past):
+    def check(value):
+        if not past and (value == "" or value is None):
+            return None
+        if isinstance(value, datetime):
+            value = value.date()
+        elif not isinstance(value, date):
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                if past:
+                    return _error("Datetime should be formatted as YYYY-MM-DD")
+                return _error(f"Datetime should be formatted as YYYY-MM-DD. Current: {value}")
+        if past and value >= date.today():
+            return _error("Date is not at the past")
+    return check
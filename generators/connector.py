@@ -1,4 +1,46 @@
-from pyArango.connection import *
+import os
 
-conn = Connection(arangoURL='http://10.90.137.225:8529', username="man", password="clinicc")
-db = conn["Clinic"]
+from instrumentation import instrument_session
+
+# Where the database is, overridable by the environment or configure() (generator.py --url etc.)
+ARANGO_URL = os.environ.get('CLINIC_ARANGO_URL', 'http://10.90.137.225:8529')
+USERNAME = os.environ.get('CLINIC_ARANGO_USERNAME', "man")
+PASSWORD = os.environ.get('CLINIC_ARANGO_PASSWORD', "clinicc")
+DB_NAME = os.environ.get('CLINIC_ARANGO_DATABASE', "Clinic")
+
+_db = None
+offline = False
+
+
+def get_db():
+    # Connects on first use; returns None in offline mode so nothing touches the network
+    global _db
+    if offline:
+        return None
+    if _db is None:
+        # pyArango.connection brings requests along, which runs that do not connect never need
+        from pyArango.connection import Connection
+
+        conn = instrument_session(Connection(arangoURL=ARANGO_URL, username=USERNAME, password=PASSWORD))
+        _db = conn[DB_NAME]
+    return _db
+
+
+def set_offline(value=True):
+    global offline
+    offline = value
+
+
+def configure(url=None, database=None, username=None, password=None):
+    # Replaces the settings that are given; the next get_db() connects with them
+    global ARANGO_URL, DB_NAME, USERNAME, PASSWORD, _db
+    ARANGO_URL = url if url is not None else ARANGO_URL
+    DB_NAME = database if database is not None else DB_NAME
+    USERNAME = username if username is not None else USERNAME
+    PASSWORD = password if password is not None else PASSWORD
+    _db = None
+
+
+def settings():
+    # What configure() takes, to hand the settings to worker processes
+    return ARANGO_URL, DB_NAME, USERNAME, PASSWORD
@@ -0,0 +1,94 @@
+import json
+import os
+
+from db_data_generators.sampling import KeyPool
+
+MANIFEST = 'manifest.json'
+
+
+class Checkpoint:
+    """Progress of generation runs, kept in <directory>/manifest.json.
+
+    For every generator the manifest holds the seed and the chunks (first row and row count) that
+    were written completely, and the KeyPool each of them returned is stored next to it. A run with
+    the same seed skips those chunks and only generates the rows still missing, so an interrupted run
+    resumes where it stopped and a larger target only adds the difference.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def chunks(self, name, seed):
+        # {first row: row count} of the finished chunks of a generator
+        entry = self.manifest.get(name)
+        if entry is None:
+            return {}
+        if entry['seed'] != seed:
+            raise ValueError(f'The checkpoint of {name} in {self.directory} was written with seed {entry["seed"]}, '
+                             f'not {seed}')
+        return {int(start): n for start, n in entry['chunks'].items()}
+
+    def rows(self, name, seed):
+        return sum(self.chunks(name, seed).values())
+
+    def missing(self, name, seed, total, chunk_size):
+        """(start, n) of the rows below total that no finished chunk covers, at most chunk_size each."""
+        ranges = []
+        position = 0
+        for start, n in sorted(self.chunks(name, seed).items()) + [(total, 0)]:
+            end = min(start, total)
+            while position < end:
+                size = min(chunk_size, end - position)
+                ranges.append((position, size))
+                position += size
+            position = max(position, start + n)
+            if position >= total:
+                break
+        return ranges
+
+    def pools(self, name, seed, total):
+        # KeyPools of the finished chunks below total
+        pools = []
+        for start, n in sorted(self.chunks(name, seed).items()):
+            path = self._pool_path(name, start)
+            if start < total and os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    pools.append(KeyPool.from_dict(json.load(f)))
+        return pools
+
+    def record(self, name, seed, start, n, pool=None):
+        if pool is not None:
+            self._write(self._pool_path(name, start), pool.to_dict())
+        entry = self.manifest.setdefault(name, {'seed': seed, 'chunks': {}})
+        entry['chunks'][str(start)] = n
+        self._write(os.path.join(self.directory, MANIFEST), self.manifest)
+
+    def _pool_path(self, name, start):
+        return os.path.join(self.directory, f'{name}.{start}.pool.json')
+
+    def _write(self, path, data):
+        # Written under another name first, so an interrupted write never leaves a broken file behind
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+
+def remove_key_range(db_conn, collections, first, last):
+    """Removes what an interrupted chunk may have written: the documents whose keys lie in [first, last).
+
+    Chunk keys all have the same number of digits, so comparing them as strings is the same as
+    comparing numbers and the primary index answers the range.
+    """
+    first, last = str(first), str(last)
+    aql = ("FOR x IN @@collection FILTER LENGTH(x._key) == @length AND x._key >= @first AND x._key < @last "
+           "REMOVE x IN @@collection")
+    for collection in collections:
+        db_conn.AQLQuery(aql, rawResults=True, bindVars={'@collection': collection, 'length': len(first),
+                                                         'first': first, 'last': last})
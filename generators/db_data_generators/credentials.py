@@ -0,0 +1,36 @@
+import random
+import string
+from hashlib import sha256
+
+# What createAuth() in util/auth.js uses by default: sha256 over salt + password, 16 character salts
+METHOD = 'sha256'
+SALT_LENGTH = 16
+PASSWORD_LENGTH = 12
+ALPHABET = string.ascii_letters + string.digits
+# Random bytes to alphanumeric characters, slightly biased to the first 8 characters, which does not matter here
+_TO_ALPHABET = bytes(ord(ALPHABET[i % len(ALPHABET)]) for i in range(256))
+
+# Template of every user's password, formatted with the user's fields (not _key, which is assigned
+# later), e.g. "{email}" or "clinicc". None gives every user a random password nobody knows.
+policy = None
+
+
+def set_policy(value):
+    global policy
+    policy = value
+
+
+def password(document, rng=random):
+    if policy is not None:
+        return policy.format_map(document)
+    return _random_string(PASSWORD_LENGTH, rng)
+
+
+def auth_data(plaintext, rng=random):
+    # The authData of a user, which auth.verify() in util/auth.js accepts for plaintext
+    salt = _random_string(SALT_LENGTH, rng)
+    return {"method": METHOD, "salt": salt, "hash": sha256((salt + plaintext).encode('utf-8')).hexdigest()}
+
+
+def _random_string(length, rng):
+    return rng.randbytes(length).translate(_TO_ALPHABET).decode('ascii')
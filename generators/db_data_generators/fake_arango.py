@@ -0,0 +1,123 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from urllib.parse import parse_qs, urlsplit
+
+ROUTES = [
+    ('import', re.compile(r'^/_db/[^/]+/_api/import$')),
+    ('document', re.compile(r'^/_db/[^/]+/_api/document/(?P<collection>[^/]+)$')),
+    ('cursor', re.compile(r'^/_db/[^/]+/_api/cursor(/[^/]+)?$')),
+]
+
+
+class FakeArango:
+    """In-process stand-in for the ArangoDB endpoints the writers use: bulk import, multi-document insert
+    and AQL cursors (which always return an empty result).
+
+    Every request waits `latency` seconds before it is answered, like a round trip to a remote server.
+    Requests, documents and request bytes are counted per endpoint in stats; with keep=True the
+    documents are also kept in collections.
+    """
+
+    def __init__(self, latency=0.0, keep=False, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.keep = keep
+        self.collections = defaultdict(list)
+        self.stats = defaultdict(lambda: {'requests': 0, 'documents': 0, 'bytes': 0})
+        self._lock = threading.Lock()
+        self._revs = count(1)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-arango', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self.collections.clear()
+            self.stats.clear()
+
+    def _record(self, endpoint, collection, documents, size):
+        with self._lock:
+            stats = self.stats[endpoint]
+            stats['requests'] += 1
+            stats['documents'] += len(documents)
+            stats['bytes'] += size
+            if self.keep and collection is not None:
+                self.collections[collection].extend(documents)
+
+    def _handle(self, method, path, body):
+        parts = urlsplit(path)
+        for endpoint, pattern in ROUTES:
+            match = pattern.match(parts.path)
+            if match is not None:
+                break
+        else:
+            return 404, {'error': True, 'code': 404, 'errorNum': 404, 'errorMessage': 'unknown path ' + parts.path}
+
+        if self.latency:
+            time.sleep(self.latency)
+        if endpoint == 'import':
+            collection = parse_qs(parts.query).get('collection', [None])[0]
+            documents = [json.loads(line) for line in body.decode('utf-8').split('\n') if line.strip()]
+            self._record(endpoint, collection, documents, len(body))
+            return 201, {'error': False, 'created': len(documents), 'errors': 0, 'empty': 0, 'updated': 0,
+                         'ignored': 0, 'details': []}
+        if endpoint == 'document':
+            collection = match.group('collection')
+            documents = json.loads(body)
+            if isinstance(documents, dict):
+                documents = [documents]
+            self._record(endpoint, collection, documents, len(body))
+            return 202, [{'_id': f'{collection}/{document.get("_key")}', '_key': document.get('_key'),
+                          '_rev': str(next(self._revs))} for document in documents]
+        self._record(endpoint, None, [], len(body))
+        return 201, {'error': False, 'code': 201, 'result': [], 'hasMore': False, 'count': 0, 'cached': False,
+                     'extra': {}}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, data = fake._handle(self.command, self.path, body)
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_POST = do_PUT = do_GET = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
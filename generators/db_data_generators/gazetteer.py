@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+
+from db_data_generators.sampling import make_rng
+from db_data_generators.spatial import Hotspots, KDTree
+
+CACHE_DIR = '.gazetteer'
+COLUMNS = ['street', 'house', 'zip_code', 'latitude', 'longitude', 'zip_street', 'zip_zip_code']
+
+_gazetteer = None
+
+
+class Gazetteer:
+    """Addresses of Streets.csv as columns: street ids into the interned street names, house numbers,
+    zip codes and coordinates, plus the known street/zip pairs of street_zip.csv.
+
+    load() parses the CSV files once into .npy files under cache_dir and memory-maps them on later runs.
+    """
+
+    def __init__(self, streets, columns):
+        self.streets = streets
+        self.street = columns['street']
+        self.house = columns['house']
+        self.zip_code = columns['zip_code']
+        self.latitude = columns['latitude']
+        self.longitude = columns['longitude']
+        self.zip_street = columns['zip_street']
+        self.zip_zip_code = columns['zip_zip_code']
+        self.street_ids = {name: i for i, name in enumerate(streets)}
+        self._rows = None
+        self._index = None
+        self._hotspots = {}
+
+    @classmethod
+    def load(cls, streets_csv='Streets.csv', street_zip_csv='street_zip.csv', cache_dir=CACHE_DIR):
+        sources = {path: os.stat(path).st_mtime for path in (streets_csv, street_zip_csv)}
+        meta_path = os.path.join(cache_dir, 'meta.json')
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta is None or meta['sources'] != sources:
+            cls._build_cache(streets_csv, street_zip_csv, cache_dir)
+            meta = {'sources': sources}
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+        with open(os.path.join(cache_dir, 'streets.txt'), encoding='utf-8') as f:
+            streets = f.read().split('\n')
+        columns = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+        return cls(streets, columns)
+
+    @staticmethod
+    def _build_cache(streets_csv, street_zip_csv, cache_dir):
+        import pandas as pd
+
+        houses = pd.read_csv(streets_csv, dtype={'house': str})
+        zips = pd.read_csv(street_zip_csv)
+        streets = pd.Index(pd.concat([houses['street'], zips['street']]).unique())
+        columns = {
+            'street': streets.get_indexer(houses['street']).astype(np.int32),
+            'house': houses['house'].to_numpy(dtype=str),
+            'zip_code': houses['zip_code'].to_numpy(dtype=np.int32),
+            'latitude': houses['latitude'].to_numpy(dtype=np.float64),
+            'longitude': houses['longitude'].to_numpy(dtype=np.float64),
+            'zip_street': streets.get_indexer(zips['street']).astype(np.int32),
+            'zip_zip_code': zips['zip_code'].to_numpy(dtype=np.int32),
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, column in columns.items():
+            np.save(os.path.join(cache_dir, name + '.npy'), column)
+        with open(os.path.join(cache_dir, 'streets.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(streets))
+
+    def __len__(self):
+        return len(self.street)
+
+    def sample(self, n, rng=None, hotspots=None):
+        """Row indices of n addresses drawn with replacement, uniformly or around hotspots: 'densest' for
+        the most populated parts of Streets.csv or a list of (longitude, latitude, radius_km, weight)."""
+        rng = rng if rng is not None else make_rng()
+        if hotspots is None:
+            return rng.integers(0, len(self), size=n)
+        return self.hotspots(hotspots).sample(n, rng)
+
+    def index(self):
+        # KDTree over the coordinates of all addresses, built on first use
+        if self._index is None:
+            self._index = KDTree(self.longitude, self.latitude)
+        return self._index
+
+    def hotspots(self, centres='densest'):
+        key = centres if isinstance(centres, str) else tuple(map(tuple, centres))
+        if key not in self._hotspots:
+            if centres == 'densest':
+                self._hotspots[key] = Hotspots.densest(self.index())
+            else:
+                self._hotspots[key] = Hotspots(self.index(), centres)
+        return self._hotspots[key]
+
+    def address(self, i, flat=None):
+        address = {"zip": int(self.zip_code[i]), "country": 'Россия', "state": 'Республика Татарстан',
+                   "city": 'Казань', "street": self.streets[self.street[i]], "building": str(self.house[i])}
+        if flat is not None:
+            address["flat"] = flat
+        return address
+
+    def residential_area(self, i):
+        return [float(self.longitude[i]), float(self.latitude[i])]
+
+    def row(self, street, house):
+        if self._rows is None:
+            self._rows = {(int(s), str(h)): i for i, (s, h) in enumerate(zip(self.street, self.house))}
+        street_id = self.street_ids.get(street)
+        return self._rows.get((street_id, str(house)))
+
+    def coordinates(self, street, house):
+        # [longitude, latitude] of an address, None if it is not in Streets.csv
+        i = self.row(street, house)
+        return None if i is None else self.residential_area(i)
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load()
+    return _gazetteer
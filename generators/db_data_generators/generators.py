@@ -1,123 +1,173 @@
 from random import randint, choices
 
-import pandas as pd
-from faker import Faker
-from tqdm import tqdm
+import numpy as np
 from default_fields import *
 from enumerators import *
 from validators import *
+from connector import get_db
+from db_data_generators.credentials import auth_data, password
+from db_data_generators.gazetteer import get_gazetteer
+from db_data_generators.graph import EdgeSet, doctor_load, usergroup_id
+from db_data_generators.pipeline import Document, Edge, default_stages, run_pipeline
+from db_data_generators.records import (AppointmentRecord, IsAppointedRecord, MemberOfRecord, PatientRecord,
+                                        StaffRecord)
+from db_data_generators.sampling import KeyPool, make_rng, sample_keys
+from db_data_generators.schedule import Timetable, load_leaves
+from db_data_generators.spatial import KDTree
+from db_data_generators.value_pools import get_pools
 
+# How generated emails stay unique, see PoolDrawer.email
+EMAIL_POLICY = 'retry'
+# Where patients live, see Gazetteer.sample: None spreads them evenly over Streets.csv
+PATIENT_HOTSPOTS = 'densest'
+# An appointment goes to one of the doctors nearest to the patient, None picks any doctor
+NEAREST_DOCTORS = 3
+# Fields of the KeyPools of written staff and patients, which appointments and leave applies sample from
+STAFF_POOL_FIELDS = ["designation", "address"]
+PATIENT_POOL_FIELDS = ["residential_area"]
+# How unevenly appointments are spread over doctors, see doctor_load: 0 gives every doctor as many
+DOCTOR_LOAD_EXPONENT = 1.0
 
-def generate_staff(db_conn):
-    staff = db_conn["clinic_Staff"]
-    perm = db_conn["clinic_memberOf"]
-    fake = Faker()
-    admin_exists = False
 
-    all_addresses = pd.read_csv('Streets.csv')
-    n_houses = len(all_addresses)
+def staff_email_taken(email):
+    return staff_emails.is_taken(get_db(), email)
+
+
+def patient_email_taken(email):
+    return patient_emails.is_taken(get_db(), email)
+
+
+def new_faker():
+    # Faker and tqdm take a while to import, they are only imported by the generators that use them
+    from faker import Faker
+
+    return Faker()
+
+
+def progress(iterable, desc):
+    from tqdm import tqdm
+
+    return tqdm(iterable, desc=desc)
+
+
+def generate(writer, records, pool=None):
+    run_pipeline(records, writer, default_stages(writer, pool))
+    return pool
+
+
+def staff_records(n=300, start=0):
+    # start: index of the first row in the whole run, the very first staff member is the admin
+    fake = new_faker()
+    values = get_pools().drawer()
+    admin_exists = start > 0
+
+    gazetteer = get_gazetteer()
+    address_ids = gazetteer.sample(n, make_rng())
     # Create dummy staff for referencing
     # st = staff.createDocument()
     # st["_id"] = 0
     # st["NULL"] = True
     # st.save()
 
-    for i in range(300):
-        address = all_addresses.iloc[randint(0, n_houses - 1)]
+    for i in range(n):
+        address = address_ids[i]
 
-        st = Staff.createDocument(staff)
+        st = StaffRecord()
         st["ssn"] = fake.ssn(taxpayer_identification_number_type="SSN")
-        try:
-            st["email"] = fake.word() + fake.word() + "@" + fake.word() + fake.word() + ".ru"
-        except ValidationError:
-            st["email"] = fake.word() + fake.word() + "@" + fake.word() + fake.word() + ".ru"
-
-        st["first_name"] = fake.first_name()
-        st["last_name"] = fake.last_name()
-        st["phone_number"] = fake.phone_number()
-        st["birth_date"] = fake.date_between(start_date="-90y", end_date="-18y")
-        st["address"] = {"zip": address['zip_code'], "country": 'Россия', "state": 'Республика Татарстан',
-                         "city": 'Казань', "street": address['street'], "building": address['house'],
-                         "flat": randint(1, 1000)}
-        st["authData"] = {"method": "sha256",
-                          "salt": "W5i/Zy7G(BTPjZ,w",
-                          "hash": "beac9317a9808becae1ef1b7b0bedff85a381ca38501e7d1841d7c88609424af"
-                          }
+        st["email"] = values.email(staff_email_taken, EMAIL_POLICY, row=start + i)
+
+        st["first_name"] = values.first_name()
+        st["last_name"] = values.last_name()
+        st["phone_number"] = values.phone_number()
+        st["birth_date"] = values.date_between(start_date="-90y", end_date="-18y")
+        st["address"] = gazetteer.address(address, flat=randint(1, 1000))
 
         r = randint(1, 10)
         if r == 1:
             # doctor
             st["designation"] = "doctor"
             st["doctor_designation"] = doctor_designations[randint(0, len(doctor_designations) - 1)]
-            mo = MemberOf.createDocument(perm)
-            mo["_from"] = "clinic_Staff/" + str(st["_key"])
-            mo["_to"] = "clinic_Usergroups/2756076"
-            mo.save()
+            usergroup = usergroup_id("doctor")
         else:
             if not admin_exists:
                 st["designation"] = staff_designations[-2]
                 admin_exists = True
             else:
                 st["designation"] = staff_designations[randint(0, len(staff_designations) - 3)]
-            mo = MemberOf.createDocument(perm)
-            mo["_from"] = "clinic_Staff/" + str(st["_key"])
-            mo["_to"] = "clinic_Usergroups/2673975"
-            mo.save()
+            usergroup = usergroup_id("staff")
 
         rq = randint(1, 4)
         sql = []
         for i in range(rq):
-            sql.append({"question": str(fake.text())[:-1] + "?", "answer": fake.word()})
+            sql.append({"question": values.text()[:-1] + "?", "answer": values.word()})
 
         st["security_questions"] = sql
-        st.save()
+        st["authData"] = auth_data(password(st))
+        staff = Document("clinic_Staff", st)
+        yield staff
+        yield Edge("clinic_memberOf", staff, usergroup, MemberOfRecord())
 
 
-def generate_tips(db_conn):
-    tips = db_conn["clinic_Tips"]
-    fake = Faker()
-    for i in range(1000):
-        tip = tips.createDocument()
-        tip["text"] = fake.text()
-        tip.save()
+def generate_staff(writer, n=300, start=0):
+    return generate(writer, staff_records(n, start), KeyPool("clinic_Staff", STAFF_POOL_FIELDS))
 
 
-def generate_appointments(db_conn):
-    appointments = db_conn["clinic_Appointments"]
-    patients = db_conn["clinic_Patients"]
-    staff = db_conn["clinic_Staff"]
+def tip_records(n=1000, start=0):
+    values = get_pools().drawer()
+    for i in range(n):
+        tip = {}
+        tip["text"] = values.text()
+        yield Document("clinic_Tips", tip)
 
-    df = pd.read_csv('Streets.csv')
-    keys = list(map(lambda x: f'{x[0]}, {x[1]}', df[['street', 'house']].to_numpy()))
-    street_coord = {}
-    for key, value in zip(keys, df[['longitude', 'latitude']].to_numpy()):
-        street_coord[key] = list(value)
 
-    fake = Faker()
+def generate_tips(writer, n=1000, start=0):
+    generate(writer, tip_records(n, start))
 
-    for i in tqdm(range(5000), desc='appointments'):
-        aql_p = "FOR x IN clinic_Patients SORT RAND() LIMIT 1 RETURN x"
-        aql_d = "FOR x IN clinic_Staff SORT RAND() FILTER x.designation == 'doctor' LIMIT 1 RETURN x"
-        doctor = db_conn.AQLQuery(aql_d, rawResults=True, batchSize=100)[0]
-        patient = db_conn.AQLQuery(aql_p, rawResults=True, batchSize=100)[0]
 
-        patient = patients[patient["_key"]]
-        doctor = staff[doctor["_key"]]
-        address = patient["address"]
-        address = address['street'] + ', ' + address['building']
+def nearest_doctors(doctors, places, rng, k=NEAREST_DOCTORS):
+    """Indices into doctors of one of the k doctors living nearest to each place ([longitude, latitude]).
+    Doctors whose address is not in the gazetteer are left out; without any located doctor (or k) every
+    doctor is drawn evenly."""
+    gazetteer = get_gazetteer()
+    located, coordinates = [], []
+    for i, address in enumerate(doctors.columns.get("address") or []):
+        where = gazetteer.coordinates(address["street"], address["building"]) if address else None
+        if where is not None:
+            located.append(i)
+            coordinates.append(where)
+    if not located or k is None:
+        return doctors.sample(len(places), rng)
+    coordinates, places = np.array(coordinates), np.array(places, dtype=np.float64).reshape(-1, 2)
+    nearest, _ = KDTree(coordinates[:, 0], coordinates[:, 1]).nearest(places[:, 0], places[:, 1], k)
+    choice = rng.integers(0, nearest.shape[1], size=len(places))
+    return np.array(located)[nearest[np.arange(len(places)), choice]]
 
-        appointment = Appointments.createDocument(appointments, default_appointment)
 
-        appointment["patient"] = patient._key
+def appointment_records(patients, doctors, n=5000, start=0):
+    # patients: KeyPool of clinic_Patients with "residential_area", doctors: KeyPool of doctors in clinic_Staff
+    # with "address"
+    rng = make_rng()
+    values = get_pools().drawer(rng)
+    patient_ids = patients.sample(n, rng)
+    residential_areas = patients["residential_area"]
+    doctor_ids = nearest_doctors(doctors, [residential_areas[i] for i in patient_ids], rng)
+
+    for i in progress(range(n), 'appointments'):
+        patient = patient_ids[i]
+        doctor_key = doctors.keys[doctor_ids[i]]
+
+        appointment = AppointmentRecord()
+
+        appointment["patient"] = patients.keys[patient]
 
         appointment["symptoms"] = choices(symptoms, k=randint(1, 3))
-        appointment["description"] = fake.text()
-        created_date = fake.date_between(start_date="-90d", end_date="today")
+        appointment["description"] = values.text()
+        created_date = values.date_between(start_date="-90d", end_date="today")
         appointment["date_created"] = created_date
-        appointment["since_when"] = fake.date_between(start_date="-2y", end_date=created_date)
+        appointment["since_when"] = values.date_between(start_date="-2y", end_date=created_date)
         r = randint(0, 2)
         appointment["payment_type"] = payment_types[r]
-        appointment['residential_area'] = street_coord[address]
+        appointment['residential_area'] = residential_areas[patient]
 
         if r == 2:
             appointment["payed"] = True
@@ -129,22 +179,26 @@ def generate_appointments(db_conn):
         r = randint(0, 4)
         appointment["status"] = appointment_status[r]
         if r == 2:
-            appointment["doctor"] = doctor._key
-            appointment["appointment_date"] = fake.date_between(start_date="today", end_date="+180d")
+            appointment["doctor"] = doctor_key
+            appointment["appointment_date"] = values.date_between(start_date="today", end_date="+180d")
         elif r == 3:
-            appointment["doctor"] = doctor._key
-            appointment["appointment_date"] = fake.date_between(start_date=created_date, end_date="today")
+            appointment["doctor"] = doctor_key
+            appointment["appointment_date"] = values.date_between(start_date=created_date, end_date="today")
         elif r == 4:
-            appointment["reject_reason"] = fake.text()
+            appointment["reject_reason"] = values.text()
         # else:
         #     appointment["appointment_date"] = None
         #     appointment["doctor"] = None
-        appointment.save()
+        yield Document("clinic_Appointments", appointment)
+
+
+def generate_appointments(writer, patients, doctors, n=5000, start=0):
+    generate(writer, appointment_records(patients, doctors, n, start))
 
 
 def generate_event(db_conn):
     event = {}
-    fake = Faker()
+    fake = new_faker()
     r = randint(1, 3)
     event['name'] = ' '.join(fake.words(randint(1, 3)))
     event['type'] = event_types[randint(0, len(event_types) - 1)]
@@ -152,162 +206,169 @@ def generate_event(db_conn):
     return event
 
 
-def generate_facilities(db_conn):
-    fake = Faker()
-    facilities = db_conn["clinic_Facilities"]
-    for i in range(100):
-        fac = Facilities.createDocument(facilities)
+def facility_records(n=100, start=0):
+    fake = new_faker()
+    values = get_pools().drawer()
+    for i in range(n):
+        fac = {}
         fac["model"] = fake.license_plate()
-        fac["description"] = fake.text()
-        fac.save()
-
+        fac["description"] = values.text()
+        yield Document("clinic_Facilities", fac)
 
-def generate_timetable(db_conn):
-    aql = "FOR x IN clinic_Staff FILTER x.designation == 'doctor' RETURN x"
-    queryResult = db_conn.AQLQuery(aql, rawResults=True, batchSize=100)
 
-    timetableCollection = db_conn["clinic_isAppointed"]
-    appointments = db_conn["clinic_Appointments"].fetchAll()
-    is_appointed = db_conn["clinic_isAppointed"]
-    timetableCollection.truncate()
+def generate_facilities(writer, n=100, start=0):
+    generate(writer, facility_records(n, start))
 
-    fake = Faker()
-    for i in range(10):
-        for doctor in queryResult:
-            appointment = appointments[randint(0, len(appointments) - 1)]
-            doc = IsAppointed.createDocument(is_appointed)
-            doc['_from'] = "clinic_Staff/" + str(doctor["_key"])
-            doc['_to'] = "clinic_Appointments/" + str(appointment["_key"])
-            doc['date'] = fake.date_between(start_date="-90y", end_date="today")
-            doc['description'] = fake.text()
-            doc['time'] = str(fake.time())[:5]
-            doc.save()
 
+def timetable_records(db_conn, rounds=10, first_round=0, seed=0):
+    # Doctors and appointment keys are read completely before the first edge is written, and only the
+    # sampled appointment keys are kept, however many appointments there are
+    rng = make_rng()
+    doctors = sorted(KeyPool.from_db(db_conn, "clinic_Staff", filters={"designation": "doctor"}).keys)
+    appointments = sample_keys(db_conn, "clinic_Appointments", rounds * len(doctors), rng)
+    # Every round adds one appointment per doctor on average, more to the busy doctors, each in a free
+    # slot of the doctor's working hours
+    timetable = Timetable(load_leaves(db_conn), seed)
+    owners, numbers = doctor_load(len(doctors), rounds, first_round, seed, DOCTOR_LOAD_EXPONENT)
+    slots = [timetable.slot(doctors[i], n) for i, n in zip(owners.tolist(), numbers.tolist())]
+    free = np.array([slot is not None for slot in slots], dtype=bool)
+    edges = EdgeSet("clinic_isAppointed", "clinic_Staff", doctors, "clinic_Appointments", appointments,
+                    owners, np.arange(len(owners))).subset(free).validate()
 
-def generate_leave_applies(db_conn):
-    applies = db_conn["clinic_LeaveApply"]
-    staff = db_conn["clinic_Staff"]
+    values = get_pools().drawer(rng)
+    for from_id, to_id, slot in zip(*edges.ids(), (slot for slot in slots if slot is not None)):
+        doc = IsAppointedRecord(date=slot[0], time=slot[1], description=values.text())
+        yield Edge("clinic_isAppointed", from_id, to_id, doc)
 
-    fake = Faker()
-    aql_a = "FOR x IN clinic_Staff SORT RAND() FILTER x.designation == 'admin' LIMIT 1 RETURN x"
-    admin = db_conn.AQLQuery(aql_a, rawResults=True, batchSize=100)[0]
-    admin = staff[admin["_key"]]
 
-    for i in range(500):
-        aql_s = "FOR x IN clinic_Staff SORT RAND() LIMIT 1 RETURN x"
+def generate_timetable(db_conn, writer, rounds=10, truncate=True, first_round=0, seed=0):
+    # truncate=False adds rounds to the existing timetable, starting with round first_round
+    if truncate:
+        db_conn["clinic_isAppointed"].truncate()
+    generate(writer, timetable_records(db_conn, rounds, first_round, seed))
 
-        member = db_conn.AQLQuery(aql_s, rawResults=True, batchSize=100)[0]
 
-        member = staff[member["_key"]]
+def leave_apply_records(staff, n=500, start=0):
+    # staff: KeyPool of clinic_Staff with "designation"
+    rng = make_rng()
+    values = get_pools().drawer(rng)
+    admins = staff.where("designation", "admin")
+    admin_key = admins.keys[admins.sample(1, rng)[0]]
+    member_ids = staff.sample(n, rng)
 
-        la = applies.createDocument()
+    for i in range(n):
+        la = {}
 
-        la["member"] = int(member['_key'])
+        la["member"] = int(staff.keys[member_ids[i]])
 
-        la["leave_reason"] = fake.text()
+        la["leave_reason"] = values.text()
 
-        begin_date = fake.date_between(start_date="today", end_date="+180d")
+        begin_date = values.date_between(start_date="today", end_date="+180d")
         la["beginning_date"] = begin_date
 
-        la["ending_date"] = fake.date_between(start_date=begin_date, end_date="+1y")
+        la["ending_date"] = values.date_between(start_date=begin_date, end_date="+1y")
 
         r = randint(0, 2)
 
         la["status"] = leave_apply_status[r]
 
         if r != 0:
-            la["reviewed_by"] = int(admin['_key'])
+            la["reviewed_by"] = int(admin_key)
 
         if r == 2:
-            la["reject_reason"] = fake.text()
+            la["reject_reason"] = values.text()
+
+        yield Document("clinic_LeaveApply", la)
 
-        la.save()
 
+def generate_leave_applies(writer, staff, n=500, start=0):
+    generate(writer, leave_apply_records(staff, n, start))
 
-def generate_home_remedies(db_conn):
-    remedies = db_conn["clinic_HomeRemedies"]
-    fake = Faker()
 
-    for i in range(2000):
-        remedy = remedies.createDocument()
-        remedy["description"] = fake.text()
+def home_remedy_records(n=2000, start=0):
+    values = get_pools().drawer()
+
+    for i in range(n):
+        remedy = {}
+        remedy["description"] = values.text()
         remedy["symptoms"] = choices(symptoms, k=randint(1, 5))
-        remedy["actions"] = fake.text()
-        remedy.save()
+        remedy["actions"] = values.text()
+        yield Document("clinic_HomeRemedies", remedy)
+
 
+def generate_home_remedies(writer, n=2000, start=0):
+    generate(writer, home_remedy_records(n, start))
 
-def generate_visitors_patients(db_conn):
-    patients = db_conn["clinic_Patients"]
-    visitors = db_conn["clinic_Visitors"]
-    perm = db_conn["clinic_memberOf"]
-    fake = Faker()
-    all_addresses = pd.read_csv('Streets.csv')
-    n_houses = len(all_addresses)
 
-    keys = list(map(lambda x: f'{x[0]}, {x[1]}', all_addresses[['street', 'house']].to_numpy()))
-    street_coord = {}
-    for key, value in zip(keys, all_addresses[['longitude', 'latitude']].to_numpy()):
-        street_coord[key] = list(value)
+def visitor_patient_records(n=10000, start=0):
+    fake = new_faker()
+    rng = make_rng()
+    values = get_pools().drawer(rng)
+    gazetteer = get_gazetteer()
+    address_ids = gazetteer.sample(n, rng, PATIENT_HOTSPOTS)
 
-    for i in tqdm(range(10000), desc='visitors_patients'):
+    for i in progress(range(n), 'visitors_patients'):
         r = randint(1, 100)
         d = randint(0, 1)
-        address = all_addresses.iloc[randint(0, n_houses - 1)]
+        address = address_ids[i]
 
         # 3 cases:
         # visited and registered (r == 1)
         # visited but not registered (r != 1 and d == 0)
         # not visited but registered (r != 1 and d == 1)
 
-        fname = fake.first_name()
-        lname = fake.last_name()
+        fname = values.first_name()
+        lname = values.last_name()
 
         if r == 1 or (r != 1 and d == 0):
             # visited & registered as patient
-            # visitor = visitors.createDocument()
-            visitor = Visitors.createDocument(visitors)
+            visitor = {}
             visitor["first_name"] = fname
             visitor["last_name"] = lname
-            visitor["visited_date"] = fake.date_between(start_date="-2y", end_date="-1d")
+            visitor["visited_date"] = values.date_between(start_date="-2y", end_date="-1d")
             if r == 1:
                 visitor["registered"] = True
             else:
                 visitor["registered"] = False
-            visitor.save()
+            yield Document("clinic_Visitors", visitor)
 
         if r == 1 or (r != 1 and d == 1):
 
-            # doc = patients.createDocument()
-            doc = Patients.createDocument(patients)
-            try:
-                doc["email"] = fake.word() + fake.word() + "@" + fake.word() + fake.word() + ".ru"
-            except ValidationError:
-                doc["email"] = fake.word() + fake.word() + "@" + fake.word() + fake.word() + ".ru"
+            doc = PatientRecord()
+            doc["email"] = values.email(patient_email_taken, EMAIL_POLICY, row=start + i)
             doc["first_name"] = fname
             doc["last_name"] = lname
-            doc["phone_number"] = fake.phone_number()
-            doc["birth_date"] = fake.date_between(start_date="-90y", end_date="-18y")
+            doc["phone_number"] = values.phone_number()
+            doc["birth_date"] = values.date_between(start_date="-90y", end_date="-18y")
             doc["ssn"] = fake.ssn(taxpayer_identification_number_type="SSN")
-            doc["address"] = {"zip": address['zip_code'], "country": 'Россия', "state": 'Республика Татарстан',
-                              "city": 'Казань', "street": address['street'], "building": address['house'],
-                              "flat": randint(1, 1000)}
-
-            address = address['street'] + ', ' + address['house']
-            doc['residential_area'] = street_coord[address]
-            doc["authData"] = {"method": "sha256",
-                               "salt": "W5i/Zy7G(BTPjZ,w",
-                               "hash": "beac9317a9808becae1ef1b7b0bedff85a381ca38501e7d1841d7c88609424af"
-                               }
+            doc["address"] = gazetteer.address(address, flat=randint(1, 1000))
+            doc['residential_area'] = gazetteer.residential_area(address)
 
             rq = randint(1, 4)
             sql = []
             for i in range(rq):
-                sql.append({"question": str(fake.text())[:-1] + "?", "answer": fake.word()})
+                sql.append({"question": values.text()[:-1] + "?", "answer": values.word()})
 
             doc["security_questions"] = sql
+            doc["authData"] = auth_data(password(doc))
+
+            patient = Document("clinic_Patients", doc)
+            yield patient
+            yield Edge("clinic_memberOf", patient, usergroup_id("patient"), MemberOfRecord())
+
+
+def generate_visitors_patients(writer, n=10000, start=0):
+    return generate(writer, visitor_patient_records(n, start), KeyPool("clinic_Patients", PATIENT_POOL_FIELDS))
+
 
-            doc.save()
-            mo = MemberOf.createDocument(perm)
-            mo["_from"] = "clinic_Patient/" + str(doc["_key"])
-            mo["_to"] = "clinic_Usergroups/2042765"
-            mo.save()
+# Collections each generator writes, to clean up after an interrupted chunk (see checkpoint.py)
+written_collections = {
+    'generate_staff': ["clinic_Staff", "clinic_memberOf"],
+    'generate_tips': ["clinic_Tips"],
+    'generate_appointments': ["clinic_Appointments"],
+    'generate_facilities': ["clinic_Facilities"],
+    'generate_timetable': ["clinic_isAppointed"],
+    'generate_leave_applies': ["clinic_LeaveApply"],
+    'generate_home_remedies': ["clinic_HomeRemedies"],
+    'generate_visitors_patients': ["clinic_Visitors", "clinic_Patients", "clinic_memberOf"],
+}
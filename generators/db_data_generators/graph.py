@@ -0,0 +1,104 @@
+import numpy as np
+
+from validators import InvalidDocument
+
+# The usergroups setup.js creates, by the designation of their members
+USERGROUPS = "clinic_Usergroups"
+USERGROUP_KEYS = {"doctor": "2756076", "staff": "2673975", "patient": "2042765"}
+
+# Vertex collections each edge collection may connect, _from and _to
+EDGE_DEFINITIONS = {
+    "clinic_memberOf": ({"clinic_Staff", "clinic_Patients"}, {USERGROUPS}),
+    "clinic_isAppointed": ({"clinic_Staff"}, {"clinic_Appointments"}),
+}
+
+
+def usergroup_id(name):
+    return USERGROUPS + "/" + USERGROUP_KEYS[name]
+
+
+def check_edge(collection, _from, _to):
+    """Raises InvalidDocument unless _from and _to are ids in the vertex collections of collection."""
+    definition = EDGE_DEFINITIONS.get(collection)
+    if definition is None:
+        return
+    errors = {}
+    for field, vertex, allowed in (('_from', _from, definition[0]), ('_to', _to, definition[1])):
+        vertex_collection, _, key = vertex.partition('/')
+        if vertex_collection not in allowed or not key:
+            errors[field] = f'{vertex} is not a document of {", ".join(sorted(allowed))}'
+    if errors:
+        raise InvalidDocument(errors)
+
+
+class EdgeSet:
+    """Edges of one edge collection between two vertex collections, as two integer arrays indexing the
+    vertex keys: edge i goes from from_keys[from_index[i]] to to_keys[to_index[i]].
+
+    The whole set is built with array operations and checked at once (validate) before ids() turns it
+    into _from/_to strings in bulk.
+    """
+
+    def __init__(self, collection, from_collection, from_keys, to_collection, to_keys, from_index, to_index):
+        self.collection = collection
+        self.from_collection = from_collection
+        self.from_keys = from_keys
+        self.to_collection = to_collection
+        self.to_keys = to_keys
+        self.from_index = np.asarray(from_index, dtype=np.int64)
+        self.to_index = np.asarray(to_index, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.from_index)
+
+    def subset(self, mask):
+        return EdgeSet(self.collection, self.from_collection, self.from_keys, self.to_collection, self.to_keys,
+                       self.from_index[mask], self.to_index[mask])
+
+    def validate(self):
+        check_edge(self.collection, self.from_collection + "/x", self.to_collection + "/x")
+        if len(self.from_index) != len(self.to_index):
+            raise ValueError(f'{self.collection}: {len(self.from_index)} _from but {len(self.to_index)} _to')
+        for field, index, keys in (('_from', self.from_index, self.from_keys), ('_to', self.to_index, self.to_keys)):
+            outside = (index < 0) | (index >= len(keys))
+            if outside.any():
+                raise InvalidDocument({field: f'{np.count_nonzero(outside)} edges of {self.collection} point '
+                                              f'outside of the {len(keys)} vertices'})
+        return self
+
+    def ids(self):
+        """(_from, _to) lists of all edges."""
+        from_ids = [self.from_collection + "/" + str(key) for key in self.from_keys]
+        to_ids = [self.to_collection + "/" + str(key) for key in self.to_keys]
+        return [from_ids[i] for i in self.from_index.tolist()], [to_ids[i] for i in self.to_index.tolist()]
+
+
+def zipf_weights(n, exponent, rng):
+    """Share of n vertices in a Zipf distribution: the vertex of rank r gets a share proportional to
+    r ** -exponent (0 is uniform), and rng decides which vertex has which rank."""
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+    weights /= weights.sum()
+    return weights[rng.permutation(n)]
+
+
+def doctor_load(doctors, rounds, first_round=0, seed=0, exponent=1.0):
+    """Which doctor every appointment edge of the rounds first_round..first_round + rounds - 1 goes to.
+
+    Every round has one edge per doctor on average, spread by zipf_weights(exponent), so some doctors
+    are much busier than others. Returns the doctor index of every edge and the number of that
+    appointment among all of the doctor's appointments since round 0. Rounds are seeded by
+    (seed, round) alone, so generating them in one go or one at a time gives the same load.
+    """
+    weights = zipf_weights(doctors, exponent, np.random.default_rng([seed, doctors]))
+    taken = np.zeros(doctors, dtype=np.int64)
+    indices, numbers = [], []
+    for i in range(first_round + rounds):
+        counts = np.random.default_rng([seed, doctors, i]).multinomial(doctors, weights)
+        if i >= first_round:
+            edges = np.repeat(np.arange(doctors), counts)
+            indices.append(edges)
+            numbers.append(taken[edges] + np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts))
+        taken += counts
+    if not indices:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(indices), np.concatenate(numbers)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import ssl
+from base64 import b64encode
+from collections import namedtuple
+from urllib.parse import urlencode, urlsplit
+
+Response = namedtuple('Response', ['status', 'headers', 'body'])
+
+# Statuses worth another attempt: timeouts, overload and cluster hiccups
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class TransientError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """At most `size` keep-alive HTTP/1.1 connections to one server, for asyncio.
+
+    Only what the ArangoDB REST API needs: requests with a body of known length, responses with
+    Content-Length, chunked encoding or read-to-close bodies. Connections are reused until the
+    server closes them or a request on them fails.
+    """
+
+    def __init__(self, url, size=8, username=None, password=None, timeout=60):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+        self.headers = {'Host': parts.netloc, 'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+        if username is not None:
+            credentials = f'{username}:{password or ""}'.encode('utf-8')
+            self.headers['Authorization'] = 'Basic ' + b64encode(credentials).decode('ascii')
+        self._idle = []
+        self._open = 0
+        self._available = None
+
+    async def request(self, method, path, body=b'', params=None):
+        if self._available is None:
+            self._available = asyncio.Semaphore(self.size)
+        target = self.base_path + path + ('?' + urlencode(params) if params else '')
+        async with self._available:
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+                self._open += 1
+            try:
+                response, keep = await asyncio.wait_for(self._exchange(connection, method, target, body),
+                                                        self.timeout)
+            except BaseException:
+                self._discard(connection)
+                raise
+            if keep:
+                self._idle.append(connection)
+            else:
+                self._discard(connection)
+            return response
+
+    async def _exchange(self, connection, method, target, body):
+        reader, writer = connection
+        head = [f'{method} {target} HTTP/1.1']
+        head += [f'{name}: {value}' for name, value in self.headers.items()]
+        head.append(f'Content-Length: {len(body)}')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Server closed the connection')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep = headers.get('connection', '').lower() != 'close'
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        else:
+            body = await reader.read()
+            keep = False
+        return Response(status, headers, body), keep
+
+    def _discard(self, connection):
+        connection[1].close()
+        self._open -= 1
+
+    async def close(self):
+        while self._idle:
+            self._discard(self._idle.pop())
+
+
+async def request_with_retry(pool, method, path, body=b'', params=None, retries=5, backoff=0.1, rng=None):
+    """pool.request(), tried again after backoff * 2 ** attempt seconds (with jitter from rng, a
+    random.Random) on connection errors, timeouts and TRANSIENT_STATUSES. Returns the last response."""
+    for attempt in range(retries + 1):
+        try:
+            response = await pool.request(method, path, body, params)
+            if response.status not in TRANSIENT_STATUSES:
+                return response
+            error = TransientError(f'HTTP {response.status}: {response.body[:200]!r}')
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            response = None
+            error = e
+        if attempt == retries:
+            if response is not None:
+                return response
+            raise error
+        jitter = 0.5 + rng.random() if rng is not None else 1.0
+        await asyncio.sleep(backoff * 2 ** attempt * jitter)
+
+
+def json_body(response):
+    try:
+        return json.loads(response.body)
+    except ValueError:
+        return {'error': True, 'errorMessage': response.body.decode('utf-8', 'replace')[:500]}
@@ -0,0 +1,137 @@
+import json
+from collections import namedtuple
+
+from pyArango.theExceptions import CreationError
+
+# An index the generators and the Foxx routes rely on. geo_json: the field is [longitude, latitude], as
+# residential_area is; a geo index without it would read the pair the other way round.
+IndexSpec = namedtuple('IndexSpec', ['collection', 'type', 'fields', 'unique', 'geo_json'], defaults=(False, False))
+
+INDEXES = [
+    # PatientEmailUniqueVal/StaffEmailUniqueVal and the login routes
+    IndexSpec("clinic_Patients", "persistent", ("email",), unique=True),
+    IndexSpec("clinic_Staff", "persistent", ("email",), unique=True),
+    # The doctors of generate_appointments, generate_timetable and generate_leave_applies
+    IndexSpec("clinic_Staff", "persistent", ("designation",)),
+    # routes/appointments.js
+    IndexSpec("clinic_Appointments", "persistent", ("patient",)),
+    IndexSpec("clinic_Appointments", "persistent", ("doctor",)),
+    IndexSpec("clinic_LeaveApply", "persistent", ("member",)),
+    IndexSpec("clinic_Patients", "geo", ("residential_area",), geo_json=True),
+    IndexSpec("clinic_Appointments", "geo", ("residential_area",), geo_json=True),
+]
+
+# Index types that answer equality and range filters on a prefix of their fields, by ArangoDB version
+_SORTED = {'persistent', 'skiplist'}
+_GEO = {'geo', 'geo1', 'geo2'}
+
+# Selective queries of the generators and the routes, which should never read a whole collection.
+# Queries that read everything on purpose (KeyPool.from_db without filters, sample_keys, warming the
+# caches) are not listed.
+QUERIES = {
+    'patient email taken': ("FOR x IN clinic_Patients FILTER x.email == @email LIMIT 1 RETURN 1",
+                            {'email': 'someone@example.com'}),
+    'staff email taken': ("FOR x IN clinic_Staff FILTER x.email == @email LIMIT 1 RETURN 1",
+                          {'email': 'someone@example.com'}),
+    'doctors': ("FOR x IN @@collection FILTER x.@f0 == @v0 RETURN [x._key]",
+                {'@collection': 'clinic_Staff', 'f0': 'designation', 'v0': 'doctor'}),
+    'appointments of a patient': ("FOR x IN clinic_Appointments FILTER x.patient == @key RETURN x", {'key': '1'}),
+    'appointments of a doctor': ("FOR x IN clinic_Appointments FILTER x.doctor == @key RETURN x", {'key': '1'}),
+    'leave of a staff member': ("FOR x IN clinic_LeaveApply FILTER x.member == @key RETURN x", {'key': 1}),
+    'patients nearby': ("FOR x IN clinic_Patients FILTER GEO_DISTANCE(@point, x.residential_area) <= @metres "
+                        "RETURN x._key", {'point': [49.12, 55.79], 'metres': 1000}),
+    'chunk leftovers': ("FOR x IN clinic_Staff FILTER LENGTH(x._key) == @length AND x._key >= @first "
+                        "AND x._key < @last RETURN x._key", {'length': 13, 'first': '1000000000000',
+                                                             'last': '1000000040000'}),
+}
+
+
+def covers(spec, index):
+    # Whether an existing index (the index description of the server) does the job of spec
+    fields = tuple(index.get('fields', ()))
+    kind = index.get('type')
+    if spec.type == 'geo':
+        return (kind in _GEO and fields == spec.fields
+                and bool(index.get('geoJson')) == spec.geo_json)
+    if spec.unique and not index.get('unique'):
+        return False
+    if kind == 'hash':
+        return fields == spec.fields
+    return kind in _SORTED and fields[:len(spec.fields)] == spec.fields
+
+
+# Indexes are listed and created through /_api/index directly: pyArango 1.3.2 has no ensurePersistentIndex,
+# no geoJson option and sorts getIndexes() into buckets of the index types it knows, without 'persistent'
+def _index_url(db_conn):
+    # Database.URL in pyArango 1.3.2, getURL() in later versions
+    url = getattr(db_conn, 'URL', None) or db_conn.getURL()
+    return f'{url}/index'
+
+
+def get_indexes(db_conn, collection):
+    # The index descriptions of the server for collection
+    r = db_conn.connection.session.get(_index_url(db_conn), params={'collection': collection})
+    data = r.json()
+    if data.get('error'):
+        raise ValueError(f'Can not list the indexes of {collection}: {data.get("errorMessage")}')
+    return data.get('indexes', [])
+
+
+def missing_indexes(db_conn, specs=INDEXES):
+    existing = {}
+    missing = []
+    for spec in specs:
+        if spec.collection not in existing:
+            existing[spec.collection] = get_indexes(db_conn, spec.collection)
+        if not any(covers(spec, index) for index in existing[spec.collection]):
+            missing.append(spec)
+    return missing
+
+
+def create_index(db_conn, spec):
+    if spec.type == 'geo':
+        payload = {'type': 'geo', 'fields': list(spec.fields), 'geoJson': spec.geo_json}
+    else:
+        payload = {'type': 'persistent', 'fields': list(spec.fields), 'unique': spec.unique, 'sparse': False}
+    r = db_conn.connection.session.post(_index_url(db_conn), params={'collection': spec.collection},
+                                        data=json.dumps(payload))
+    data = r.json()
+    if data.get('error'):
+        raise CreationError(data.get('errorMessage', 'Can not create the index'), data)
+    return data
+
+
+def full_scans(db_conn, query, bind_vars=None):
+    """Collections the optimal plan of query reads completely, from EXPLAIN."""
+    explained = db_conn.explainAQLQuery(query, bindVars=bind_vars or {})
+    if explained.get('error'):
+        raise ValueError(f'Can not explain {query}: {explained.get("errorMessage")}')
+    return [node['collection'] for node in explained['plan']['nodes'] if node['type'] == 'EnumerateCollectionNode']
+
+
+def bootstrap(db_conn, create=True, specs=INDEXES, queries=QUERIES):
+    """Creates the missing indexes of specs (create=False only reports them), then explains queries.
+
+    Returns the lines of a report and whether everything is in place: no index missing or failed to be
+    created and no query scanning a whole collection.
+    """
+    lines = []
+    ok = True
+    for spec in missing_indexes(db_conn, specs):
+        described = f'{spec.type} index on {spec.collection}({", ".join(spec.fields)})'
+        if not create:
+            lines.append(f'missing {described}')
+            ok = False
+            continue
+        try:
+            create_index(db_conn, spec)
+            lines.append(f'created {described}')
+        except CreationError as e:
+            lines.append(f'could not create {described}: {e}')
+            ok = False
+    for name, (query, bind_vars) in queries.items():
+        scanned = full_scans(db_conn, query, bind_vars)
+        if scanned:
+            lines.append(f'{name}: full scan of {", ".join(scanned)}')
+            ok = False
+    return lines, ok
@@ -0,0 +1,156 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+
+import connector
+import instrumentation
+from db_data_generators import credentials
+from db_data_generators.checkpoint import remove_key_range
+from db_data_generators.generators import written_collections
+from db_data_generators.sampling import KeyPool
+from validators import patient_emails, patient_refs, staff_emails, staff_refs, warm_caches
+
+CHUNK_SIZE = 10000
+# Upper bound of documents and edges one row writes, every chunk gets its own block of keys
+KEYS_PER_ROW = 4
+KEY_BASE = 10 ** 12
+
+reference_caches = {"clinic_Patients": patient_refs, "clinic_Staff": staff_refs}
+# Indexes and caches whose stats the parent process reports for the whole run
+cache_stats = [patient_emails, staff_emails, patient_refs, staff_refs]
+_worker = False
+# Arguments of the generator the chunks of this process run, see share_args
+_args = ()
+
+
+def derive_seed(seed, name, chunk):
+    digest = blake2b(f'{seed}:{name}:{chunk}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def init_worker(offline, instrumented=False, password_policy=None, connection=None, args=()):
+    global _worker
+    _worker = True
+    if connection is not None:
+        connector.configure(*connection)
+    credentials.set_policy(password_policy)
+    if instrumented:
+        instrumentation.enable()
+    connector.set_offline(offline)
+    if not offline:
+        warm_caches(connector.get_db())
+    share_args(args)
+
+
+def share_args(args):
+    """Hands the generator arguments to the chunks of this process once, instead of with every task.
+
+    References handed to a worker must pass the existence validators there as well, so the KeyPools
+    among them become the sources of the reference caches.
+    """
+    global _args
+    _args = args
+    for pool in args:
+        cache = reference_caches.get(pool.collection) if isinstance(pool, KeyPool) else None
+        if cache is not None:
+            cache.use(pool.keys, pool[cache.field] if cache.field else None)
+
+
+def take_cache_stats():
+    # The counters of cache_stats since the last call, which start over at zero
+    taken = []
+    for cache in cache_stats:
+        taken.append(dict(cache.stats))
+        cache.stats.update(dict.fromkeys(cache.stats, 0))
+    return taken
+
+
+def merge_cache_stats(taken):
+    for cache, stats in zip(cache_stats, taken):
+        for name, value in stats.items():
+            cache.stats[name] += value
+
+
+def chunk_keys(seed, name, start, n, keys_per_row=KEYS_PER_ROW):
+    # [first, last) of the keys of rows start..start + n, the same in every run with this seed
+    first = KEY_BASE + derive_seed(seed, name, -1) % KEY_BASE + start * keys_per_row
+    return first, first + n * keys_per_row
+
+
+def run_chunk(task):
+    from faker.generator import random as faker_random
+
+    generator, make_writer, seed, start, n, clean = task
+    chunk_seed = derive_seed(seed, generator.__name__, start)
+    random.seed(chunk_seed)
+    faker_random.seed(chunk_seed)
+
+    first, last = chunk_keys(seed, generator.__name__, start, n)
+    if clean and connector.get_db() is not None:
+        remove_key_range(connector.get_db(), written_collections[generator.__name__], first, last)
+
+    with make_writer(f'{generator.__name__}.{start:05d}') as writer:
+        writer.reset_keys(first)
+        instrumentation.instrument_session(writer)
+        result = generator(writer, *_args, n=n, start=start)
+    # Workers hand their metrics and cache stats over with every chunk, in-process chunks record them directly
+    snapshot = instrumentation.metrics.take() if _worker and instrumentation.metrics.enabled else None
+    stats = take_cache_stats() if _worker else None
+    return result, writer.reports, snapshot, stats
+
+
+def generate_parallel(generator, make_writer, total, *args, seed=0, chunk_size=CHUNK_SIZE, processes=None,
+                      checkpoint=None):
+    """Runs generator over `total` rows split into chunks of chunk_size, each in its own writer.
+
+    make_writer(part) must be a picklable top-level function, part names the chunk as <generator>.<first
+    row>. Every chunk seeds random and Faker with a seed derived from (seed, generator, start) and gets its
+    own block of keys (chunk_keys), so the documents do not depend on the number of processes;
+    processes=1 runs the chunks in this process. args go to every process once (share_args). With a
+    Checkpoint, chunks finished by earlier runs are skipped, leftovers of interrupted ones are removed
+    before they are generated again and every chunk written without errors is recorded. Returns the merged KeyPool of generators that return one (None otherwise) and the batch
+    reports of all writers.
+    """
+    name = generator.__name__
+    if checkpoint is not None:
+        ranges = checkpoint.missing(name, seed, total, chunk_size)
+        done = checkpoint.pools(name, seed, total)
+    else:
+        ranges = [(start, min(chunk_size, total - start)) for start in range(0, total, chunk_size)]
+        done = []
+    tasks = [(generator, make_writer, seed, start, n, checkpoint is not None) for start, n in ranges]
+
+    def record(task, result, reports):
+        if checkpoint is not None and not any(report.errors for report in reports):
+            checkpoint.record(name, seed, task[3], task[4], result if isinstance(result, KeyPool) else None)
+
+    if processes == 1 or not tasks:
+        share_args(args)
+        return _merge(tasks, map(run_chunk, tasks), done, record)
+
+    context = multiprocessing.get_context('spawn')
+    initargs = (connector.offline, instrumentation.metrics.enabled, credentials.policy, connector.settings(), args)
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker, initargs=initargs) as executor:
+        return _merge(tasks, executor.map(run_chunk, tasks), done, record)
+
+
+def _merge(tasks, results, done, record):
+    merged = None
+    reports = []
+    for pool in done:
+        if merged is None:
+            merged = KeyPool(pool.collection, pool.fields)
+        merged.extend(pool)
+    for task, (result, chunk_reports, snapshot, stats) in zip(tasks, results):
+        reports.extend(chunk_reports)
+        if snapshot is not None:
+            instrumentation.metrics.merge(snapshot)
+        if stats is not None:
+            merge_cache_stats(stats)
+        record(task, result, chunk_reports)
+        if isinstance(result, KeyPool):
+            if merged is None:
+                merged = KeyPool(result.collection, result.fields)
+            merged.extend(result)
+    return merged, reports
@@ -0,0 +1,137 @@
+import threading
+from collections import namedtuple
+from queue import Queue
+
+from compiled_schema import validate_compiled
+from db_data_generators.graph import check_edge
+from db_data_generators.records import Record
+from validators import *
+
+QUEUE_SIZE = 64
+BATCH_SIZE = 500
+
+# What the record producers yield. An edge end is either a document id or a Document yielded before it,
+# which is replaced by its id once the document has a key.
+Document = namedtuple('Document', ['collection', 'data'])
+Edge = namedtuple('Edge', ['collection', 'from_vertex', 'to_vertex', 'data'])
+
+schemas = {
+    "clinic_Staff": Staff,
+    "clinic_Patients": Patients,
+    "clinic_Visitors": Visitors,
+    "clinic_Appointments": Appointments,
+    "clinic_Facilities": Facilities,
+}
+
+
+def assign_keys(new_key):
+    # Every document and edge gets its key here, in the order the producer yields them
+    def stage(record):
+        if isinstance(record, Document):
+            if '_key' not in record.data:
+                record.data['_key'] = new_key()
+            return record
+        # Edge records are filled in place, like documents
+        data = record.data if isinstance(record.data, Record) else dict(record.data) if record.data else {}
+        data['_key'] = new_key()
+        return record._replace(from_vertex=vertex_id(record.from_vertex), to_vertex=vertex_id(record.to_vertex),
+                               data=data)
+    return stage
+
+
+def vertex_id(vertex):
+    if isinstance(vertex, Document):
+        return vertex.collection + "/" + vertex.data['_key']
+    return vertex
+
+
+def validate(record):
+    if isinstance(record, Edge):
+        check_edge(record.collection, record.from_vertex, record.to_vertex)
+        return record
+    schema = schemas.get(record.collection)
+    if schema is not None:
+        validate_compiled(schema, record.data)
+    return record
+
+
+def track_written(record):
+    # Keeps the uniqueness indexes and reference caches current for the records that come after this one
+    if record.collection == "clinic_Staff":
+        staff_emails.add(record.data["email"])
+        staff_refs.on_write(record.data)
+    elif record.collection == "clinic_Patients":
+        patient_emails.add(record.data["email"])
+        patient_refs.on_write(record.data)
+    return record
+
+
+def collect(pool):
+    def stage(record):
+        if record.collection == pool.collection:
+            pool.add(record.data['_key'], record.data)
+        return record
+    return stage
+
+
+def default_stages(writer, pool=None):
+    stages = [assign_keys(writer.new_key), validate, track_written]
+    if pool is not None:
+        stages.append(collect(pool))
+    return stages
+
+
+def run_pipeline(records, writer, stages, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+    """Sends records through stages (in this thread, in order) and writes them from a writer thread.
+
+    A stage takes a record and returns it, possibly changed, or None to drop it. Records cross to the
+    writer thread in lists of batch_size over a queue of queue_size lists, so generating the next records
+    overlaps with sending the previous ones and memory stays bounded however many records there are.
+    """
+    queue = Queue(queue_size)
+    failure = []
+
+    def write():
+        while True:
+            batch = queue.get()
+            if batch is None:
+                break
+            if failure:
+                continue
+            try:
+                for record in batch:
+                    if isinstance(record, Document):
+                        writer.insert(record.collection, record.data)
+                    else:
+                        writer.insert_edge(record.collection, record.from_vertex, record.to_vertex, record.data)
+            except Exception as e:
+                failure.append(e)
+        if not failure:
+            try:
+                writer.flush()
+            except Exception as e:
+                failure.append(e)
+
+    thread = threading.Thread(target=write, name='pipeline-writer', daemon=True)
+    thread.start()
+    batch = []
+    try:
+        for record in records:
+            for stage in stages:
+                record = stage(record)
+                if record is None:
+                    break
+            else:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    queue.put(batch)
+                    batch = []
+                    if failure:
+                        break
+        if batch and not failure:
+            queue.put(batch)
+    finally:
+        queue.put(None)
+        thread.join()
+    if failure:
+        raise failure[0]
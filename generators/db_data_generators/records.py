@@ -0,0 +1,81 @@
+from default_fields import default_appointment
+
+
+class Record:
+    """A row with a fixed set of fields kept in __slots__ instead of a dict.
+
+    Records look enough like a dict for the pipeline, the validators and the writers (in, [], get(),
+    items()); a field that was never set is missing, like an absent dict key. They are turned into
+    dicts only while a batch is serialized (see json_default), so rows waiting in the pipeline queue
+    and the writer buffers take about half the memory of dicts with the same fields.
+    """
+    __slots__ = ()
+    defaults = {}
+
+    def __init__(self, **fields):
+        for name, value in self.defaults.items():
+            setattr(self, name, value)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise KeyError(f'{type(self).__name__} has no field {name}') from None
+
+    def __contains__(self, name):
+        return name in self.__slots__ and hasattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def items(self):
+        # Fields in __slots__ order, which is the order the generators fill them in
+        return [(name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name)]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class StaffRecord(Record):
+    __slots__ = ('ssn', 'email', 'first_name', 'last_name', 'phone_number', 'birth_date', 'address', 'authData',
+                 'designation', 'doctor_designation', 'security_questions', '_key')
+
+
+class PatientRecord(Record):
+    __slots__ = ('email', 'first_name', 'last_name', 'phone_number', 'birth_date', 'ssn', 'address',
+                 'residential_area', 'authData', 'security_questions', '_key')
+
+
+class AppointmentRecord(Record):
+    __slots__ = ('patient', 'symptoms', 'description', 'date_created', 'since_when', 'payment_type', 'payed',
+                 'urgent', 'status', 'residential_area', 'doctor', 'appointment_date', 'reject_reason', '_key')
+    defaults = default_appointment
+
+
+class MemberOfRecord(Record):
+    __slots__ = ('_key', '_from', '_to')
+
+
+class IsAppointedRecord(Record):
+    __slots__ = ('date', 'time', 'description', '_key', '_from', '_to')
+
+
+def json_default(value):
+    # json.dumps(..., default=json_default) writes records as objects and anything else (dates) as strings
+    if isinstance(value, Record):
+        return value.to_dict()
+    return str(value)
@@ -0,0 +1,114 @@
+from itertools import chain
+from random import getrandbits
+
+import numpy as np
+
+
+def make_rng():
+    # Seeded from the random module, so seeding random also makes the numpy draws reproducible
+    return np.random.default_rng(getrandbits(64))
+
+
+def sample_keys(db_conn, collection, n, rng=None, batch_size=10000):
+    """n keys of collection drawn uniformly with replacement, streaming only the keys through a cursor.
+
+    Every draw is a reservoir of one: after t keys it holds each of them with probability 1/t, so
+    memory depends on n and batch_size but not on the size of the collection.
+    """
+    rng = rng if rng is not None else make_rng()
+    sample = np.empty(n, dtype=object)
+    seen = 0
+    batch = []
+    cursor = db_conn.AQLQuery("FOR x IN @@collection RETURN x._key", rawResults=True, batchSize=batch_size,
+                              bindVars={'@collection': collection})
+    for key in chain(cursor, [None]):
+        if key is not None:
+            batch.append(key)
+            if len(batch) < batch_size:
+                continue
+        if not batch:
+            break
+        # A draw lands in this batch with probability len(batch) / (seen + len(batch)), uniformly
+        positions = rng.integers(0, seen + len(batch), size=n)
+        hits = positions >= seen
+        sample[hits] = np.array(batch, dtype=object)[positions[hits] - seen]
+        seen += len(batch)
+        batch = []
+    if n and not seen:
+        raise ValueError(f'No documents to sample from {collection}')
+    return sample.tolist()
+
+
+class KeyPool:
+    """Keys of one collection plus a few projected fields, sampled locally instead of with SORT RAND().
+
+    A pool is either filled by the generator that wrote the documents (add) or loaded once
+    from the database with a single projection scan (from_db).
+    """
+
+    def __init__(self, collection, fields=()):
+        self.collection = collection
+        self.fields = list(fields)
+        self.keys = []
+        self.columns = {field: [] for field in self.fields}
+
+    @classmethod
+    def from_db(cls, db_conn, collection, fields=(), filters=None, batch_size=10000):
+        pool = cls(collection, fields)
+        bind_vars = {'@collection': collection}
+        aql = "FOR x IN @@collection"
+        for i, (field, value) in enumerate((filters or {}).items()):
+            aql += f" FILTER x.@f{i} == @v{i}"
+            bind_vars[f'f{i}'] = field
+            bind_vars[f'v{i}'] = value
+        aql += " RETURN [x._key" + ''.join(f", x.@p{i}" for i in range(len(pool.fields))) + "]"
+        bind_vars.update({f'p{i}': field for i, field in enumerate(pool.fields)})
+
+        for row in db_conn.AQLQuery(aql, rawResults=True, batchSize=batch_size, bindVars=bind_vars):
+            pool.keys.append(row[0])
+            for field, value in zip(pool.fields, row[1:]):
+                pool.columns[field].append(value)
+        return pool
+
+    @classmethod
+    def from_dict(cls, data):
+        pool = cls(data['collection'], data['fields'])
+        pool.keys = data['keys']
+        pool.columns = data['columns']
+        return pool
+
+    def to_dict(self):
+        return {'collection': self.collection, 'fields': self.fields, 'keys': self.keys, 'columns': self.columns}
+
+    def add(self, key, document):
+        self.keys.append(key)
+        for field in self.fields:
+            self.columns[field].append(document.get(field))
+
+    def extend(self, other):
+        self.keys.extend(other.keys)
+        for field in self.fields:
+            self.columns[field].extend(other.columns[field])
+
+    def where(self, field, value):
+        pool = KeyPool(self.collection, self.fields)
+        column = self.columns[field]
+        for i, key in enumerate(self.keys):
+            if column[i] == value:
+                pool.keys.append(key)
+                for f in self.fields:
+                    pool.columns[f].append(self.columns[f][i])
+        return pool
+
+    def sample(self, n, rng=None):
+        # Indices of n documents drawn uniformly with replacement
+        if not self.keys:
+            raise ValueError(f'No documents to sample from {self.collection}')
+        rng = rng if rng is not None else make_rng()
+        return rng.integers(0, len(self.keys), size=n)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __len__(self):
+        return len(self.keys)
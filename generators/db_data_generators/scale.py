@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+# One generator run. count is the number of rows at scale factor 1 (rounds for the timetable, which
+# writes one edge per doctor and round and so already grows with the staff). rows_per_sec and
+# bytes_per_row were measured on one core writing JSONL; rows_per_count is how many documents and
+# edges a row writes on average.
+Stage = namedtuple('Stage', ['name', 'count', 'scaled', 'requires', 'rows_per_count', 'bytes_per_row',
+                             'rows_per_sec'])
+
+DOCTOR_SHARE = 0.1
+
+# In dependency order
+STAGES = [
+    Stage('staff', 300, True, (), 2, 590, 2900),
+    Stage('visitors_patients', 10000, True, (), 1.5, 445, 20000),
+    Stage('tips', 1000, True, (), 1, 190, 89000),
+    Stage('appointments', 5000, True, ('staff', 'visitors_patients'), 1, 525, 19000),
+    Stage('home_remedies', 2000, True, (), 1, 435, 40000),
+    Stage('leave_applies', 500, True, ('staff',), 1, 385, 37000),
+    Stage('facilities', 100, True, (), 1, 215, 29000),
+    Stage('timetable', 10, False, ('staff', 'appointments'), None, 200, 20000),
+]
+stages = {stage.name: stage for stage in STAGES}
+
+PlanItem = namedtuple('PlanItem', ['stage', 'count', 'rows', 'bytes', 'seconds'])
+
+
+def parse_counts(values):
+    # ["appointments=20000", ...] -> {"appointments": 20000}
+    counts = {}
+    for value in values or ():
+        name, _, count = value.partition('=')
+        if name not in stages:
+            raise ValueError(f'Unknown collection "{name}", must be one of {", ".join(stages)}')
+        try:
+            counts[name] = int(count)
+        except ValueError:
+            raise ValueError(f'Count of {name} must be an integer, got "{count}"')
+        if counts[name] < 0:
+            raise ValueError(f'Count of {name} must not be negative')
+    return counts
+
+
+def make_plan(scale=1.0, counts=None, only=None):
+    """Rows per stage for a scale factor, in dependency order.
+
+    counts overrides the scaled count of single stages, only restricts the plan to the given stage names
+    (the stages they require are then expected to be in the database already).
+    """
+    if scale <= 0:
+        raise ValueError('Scale factor must be positive')
+    counts = counts or {}
+    for name in only or ():
+        if name not in stages:
+            raise ValueError(f'Unknown collection "{name}", must be one of {", ".join(stages)}')
+
+    planned = {}
+    plan = []
+    for stage in STAGES:
+        count = counts.get(stage.name)
+        if count is None:
+            count = max(1, round(stage.count * scale)) if stage.scaled else stage.count
+        planned[stage.name] = count
+        if only and stage.name not in only:
+            continue
+        if stage.rows_per_count is None:
+            rows = round(count * planned['staff'] * DOCTOR_SHARE)
+        else:
+            rows = round(count * stage.rows_per_count)
+        plan.append(PlanItem(stage, count, rows, rows * stage.bytes_per_row, rows / stage.rows_per_sec))
+    return plan
+
+
+def format_plan(plan, processes=1):
+    lines = [f'{"collection":<20}{"count":>10}{"rows":>12}{"size":>12}{"time":>10}']
+    for item in plan:
+        lines.append(f'{item.stage.name:<20}{item.count:>10}{item.rows:>12}{_size(item.bytes):>12}'
+                     f'{_duration(_parallel(item, processes)):>10}')
+    rows = sum(item.rows for item in plan)
+    size = sum(item.bytes for item in plan)
+    seconds = sum(_parallel(item, processes) for item in plan)
+    lines.append(f'{"total":<20}{"":>10}{rows:>12}{_size(size):>12}{_duration(seconds):>10}')
+    if seconds:
+        lines.append(f'~{rows / seconds:.0f} rows/s on {processes} process(es), ~{_size(size / seconds)}/s')
+    return '\n'.join(lines)
+
+
+def _parallel(item, processes):
+    # The timetable runs in one process
+    return item.seconds if item.stage.rows_per_count is None else item.seconds / processes
+
+
+def _size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}'
+        n /= 1024
+    return f'{n:.1f} TB'
+
+
+def _duration(seconds):
+    if seconds < 60:
+        return f'{seconds:.1f}s'
+    if seconds < 3600:
+        return f'{seconds / 60:.1f}m'
+    return f'{seconds / 3600:.1f}h'
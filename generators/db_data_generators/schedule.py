@@ -0,0 +1,128 @@
+from bisect import bisect_right
+from datetime import date, timedelta
+
+import numpy as np
+
+# Doctors see patients on weekdays from 9:00 to 18:00 in slots of 30 minutes
+WORKDAY = (9 * 60, 18 * 60)
+SLOT_MINUTES = 30
+# Days before and after today that timetables are spread over
+HORIZON = (365, 180)
+MASK = (1 << 64) - 1
+
+
+class Calendar:
+    """The free slots of one doctor: the working days of [first_day, last_day) minus the leave periods,
+    as sorted disjoint day intervals with the running count of their slots.
+
+    Slots are numbered 0..len(calendar) - 1 in time order and slot(i) finds one by bisection.
+    """
+
+    def __init__(self, first_day, last_day, leaves=(), workday=WORKDAY, slot_minutes=SLOT_MINUTES):
+        self.workday = workday
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = (workday[1] - workday[0]) // slot_minutes
+        self.starts = []
+        self.offsets = [0]
+        cursor = first_day
+        for begin, end in sorted(leaves) + [(last_day, last_day)]:
+            # Leave periods include their last day
+            begin, end = min(max(begin, first_day), last_day), min(end + timedelta(days=1), last_day)
+            if begin > cursor:
+                days = int(np.busday_count(cursor, begin))
+                if days:
+                    self.starts.append(_next_weekday(cursor))
+                    self.offsets.append(self.offsets[-1] + days * self.slots_per_day)
+            cursor = max(cursor, end)
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def slot(self, i):
+        # (date, minutes since midnight) of free slot i
+        interval = bisect_right(self.offsets, i) - 1
+        day, position = divmod(i - self.offsets[interval], self.slots_per_day)
+        first = self.starts[interval]
+        weeks, weekday = divmod(first.weekday() + day, 5)
+        when = first + timedelta(days=weeks * 7 + weekday - first.weekday())
+        return when, self.workday[0] + position * self.slot_minutes
+
+
+def _next_weekday(day):
+    return day + timedelta(days=7 - day.weekday()) if day.weekday() >= 5 else day
+
+
+class Permutation:
+    """A keyed bijection of range(size): a Feistel network on the next even power of two, walking the
+    cycle until the value falls inside the range. Drawing slot permutation[n] for a doctor's n-th
+    appointment never gives the same slot twice and needs no memory of the slots already taken."""
+
+    def __init__(self, size, key, rounds=4):
+        self.size = size
+        self.half = max(1, (max(size - 1, 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half) - 1
+        self.keys = [_mix(key + i) for i in range(rounds)]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        x = i
+        while True:
+            left, right = x >> self.half, x & self.half_mask
+            for key in self.keys:
+                left, right = right, left ^ (_mix(right ^ key) & self.half_mask)
+            x = (left << self.half) | right
+            if x < self.size:
+                return x
+
+
+def _mix(x):
+    # splitmix64 finaliser
+    x = (x + 0x9e3779b97f4a7c15) & MASK
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & MASK
+    return x ^ (x >> 31)
+
+
+class Timetable:
+    """Non-overlapping appointment slots for doctors.
+
+    The n-th appointment of a doctor gets slot Permutation(...)[n] of the doctor's Calendar, keyed by
+    seed and doctor key. Allocating n appointments costs O(n log n) and the same (seed, doctor, n)
+    always gives the same slot, so rounds generated in separate runs do not collide either.
+    """
+
+    def __init__(self, leaves=None, seed=0, today=None, horizon=HORIZON):
+        today = today if today is not None else date.today()
+        self.first_day = today - timedelta(days=horizon[0])
+        self.last_day = today + timedelta(days=horizon[1])
+        self.leaves = leaves or {}
+        self.seed = seed
+        self.calendars = {}
+
+    def slot(self, doctor, n):
+        """(date, "hh:mm") of appointment n of doctor, None once the doctor's calendar is full."""
+        entry = self.calendars.get(doctor)
+        if entry is None:
+            calendar = Calendar(self.first_day, self.last_day, self.leaves.get(doctor, ()))
+            key = int.from_bytes(str(doctor).encode('utf-8'), 'little') ^ _mix(self.seed)
+            entry = self.calendars[doctor] = (calendar, Permutation(len(calendar), key))
+        calendar, permutation = entry
+        if n >= len(calendar):
+            return None
+        day, minutes = calendar.slot(permutation[n])
+        return day, f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def load_leaves(db_conn):
+    # Leave periods that are not rejected, per staff key
+    aql = ("FOR x IN clinic_LeaveApply FILTER x.status != 'Rejected' "
+           "RETURN [x.member, x.beginning_date, x.ending_date]")
+    leaves = {}
+    for member, begin, end in db_conn.AQLQuery(aql, rawResults=True, batchSize=10000):
+        leaves.setdefault(str(member), []).append((_date(begin), _date(end)))
+    return leaves
+
+
+def _date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value[:10])
@@ -0,0 +1,251 @@
+import json
+import os
+import re
+import shutil
+from hashlib import sha256
+
+import numpy as np
+
+from db_data_generators.records import json_default
+from db_data_generators.writers import Writer
+
+# Part of every snapshot key and object, a new format gets new keys instead of misreading old snapshots
+VERSION = 1
+MAGIC = b'CLINSNAP'
+_DECIMAL = re.compile(r'0|-?[1-9][0-9]{0,17}')
+
+
+def snapshot_key(seed, counts, **settings):
+    """Name of the snapshot of a run: a hash of the format version, the seed, the rows per collection
+    ({name: count}, which follow from the scale factor) and any other setting the data depends on."""
+    description = {'version': VERSION, 'seed': seed, 'counts': counts, 'settings': settings}
+    return sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+class SnapshotStore:
+    """Generated datasets kept in a directory for reloading without generating them again.
+
+    <directory>/<key>.json lists the objects of every collection of the snapshot `key`. An object is a
+    part of one collection in the columnar format of encode_columns, stored as objects/<sha256 of its
+    bytes>, so snapshots that share a part (the tips of two scale factors, say) share its file. Writers
+    made by writer() add their parts to staging/<key> and save() turns those into the snapshot.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+    def _manifest_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest)
+
+    def staging(self, key):
+        return os.path.join(self.directory, 'staging', key)
+
+    def exists(self, key):
+        return os.path.exists(self._manifest_path(key))
+
+    def clear_staging(self, key):
+        shutil.rmtree(self.staging(key), ignore_errors=True)
+
+    def add(self, key, collection, data):
+        # Stores one part of collection, safe to call from several processes at once
+        digest = sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        staging = self.staging(key)
+        os.makedirs(staging, exist_ok=True)
+        open(os.path.join(staging, f'{collection}.{digest}'), 'w').close()
+        return digest
+
+    def save(self, key, **description):
+        # Turns the staged parts into the snapshot key
+        collections = {}
+        for name in sorted(os.listdir(self.staging(key))):
+            collection, _, digest = name.rpartition('.')
+            collections.setdefault(collection, []).append(digest)
+        manifest = dict(description, version=VERSION, collections=collections)
+        with open(self._manifest_path(key) + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(self._manifest_path(key) + '.tmp', self._manifest_path(key))
+        self.clear_staging(key)
+        return manifest
+
+    def restore(self, key, writer):
+        """Writes every document and edge of the snapshot key to writer, one part at a time."""
+        with open(self._manifest_path(key), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['version'] != VERSION:
+            raise ValueError(f'Snapshot {key} has format version {manifest["version"]}, not {VERSION}')
+        rows = {}
+        for collection, digests in manifest['collections'].items():
+            for digest in digests:
+                with open(self._object_path(digest), 'rb') as f:
+                    documents = decode_columns(f.read())
+                for document in documents:
+                    writer.insert(collection, document)
+                rows[collection] = rows.get(collection, 0) + len(documents)
+        writer.flush()
+        return rows
+
+    def writer(self, key, inner):
+        return SnapshotWriter(inner, self, key)
+
+
+class SnapshotWriter(Writer):
+    """Writes through to another writer and adds everything written to a SnapshotStore on close()."""
+
+    def __init__(self, inner, store, key):
+        super().__init__(inner.batch_size, inner.on_error)
+        self.inner = inner
+        self.store = store
+        self.key = key
+        self.reports = inner.reports
+        self.documents = {}
+
+    @property
+    def session(self):
+        return getattr(self.inner, 'session', None)
+
+    @session.setter
+    def session(self, value):
+        self.inner.session = value
+
+    def _dispatch(self, collection, batch):
+        self.documents.setdefault(collection, []).extend(batch)
+        self.inner._dispatch(collection, batch)
+
+    def wait(self):
+        self.inner.wait()
+
+    def close(self):
+        super().close()
+        self.inner.close()
+        if not self.failed:
+            for collection, documents in self.documents.items():
+                self.store.add(self.key, collection, encode_columns(documents))
+        self.documents = {}
+
+
+def encode_columns(documents):
+    """documents (dicts or Records) as bytes: MAGIC, the length and JSON of a header, then the arrays.
+
+    Every top-level field is a column, stored by the type of its values: numpy arrays for numbers and
+    booleans, decimal strings like _key as int64, document ids (_from, _to) as collection codes plus
+    keys, other strings as UTF-8 with offsets, anything else (dates, lists, dicts) as one JSON array.
+    Columns missing in some documents carry a mask of the documents that have them.
+    """
+    columns = {}
+    for i, document in enumerate(documents):
+        for name, value in document.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = ([], [])
+            column[0].append(i)
+            column[1].append(value)
+
+    header = {'version': VERSION, 'rows': len(documents), 'columns': []}
+    arrays = []
+
+    def add(array):
+        arrays.append(np.ascontiguousarray(array))
+        return [array.dtype.str, len(array)]
+
+    for name, (rows, values) in columns.items():
+        entry = {'name': name}
+        if len(rows) < len(documents):
+            present = np.zeros(len(documents), dtype=np.bool_)
+            present[rows] = True
+            entry['present'] = add(present)
+        entry.update(_encode(values, add))
+        header['columns'].append(entry)
+
+    header = json.dumps(header).encode('utf-8')
+    return b''.join([MAGIC, len(header).to_bytes(4, 'little'), header] + [array.tobytes() for array in arrays])
+
+
+def _encode(values, add):
+    types = set(map(type, values))
+    if types == {bool}:
+        return {'kind': 'bool', 'values': add(np.array(values, dtype=np.bool_))}
+    if types == {int} and -1 << 63 <= min(values) and max(values) < 1 << 63:
+        return {'kind': 'int', 'values': add(np.array(values, dtype=np.int64))}
+    if types == {float}:
+        return {'kind': 'float', 'values': add(np.array(values, dtype=np.float64))}
+    if types == {str}:
+        if all('/' in value for value in values):
+            collections, _, keys = zip(*(value.partition('/') for value in values))
+            names, codes = np.unique(np.array(collections, dtype=object), return_inverse=True)
+            entry = _encode_strings(keys, add)
+            return dict(entry, kind='id', collections=names.tolist(), key_kind=entry['kind'],
+                        codes=add(codes.astype(np.int32)))
+        return _encode_strings(values, add)
+    text = json.dumps(values, default=json_default, ensure_ascii=False).encode('utf-8')
+    return {'kind': 'json', 'values': add(np.frombuffer(text, dtype=np.uint8))}
+
+
+def _encode_strings(values, add):
+    if all(_DECIMAL.fullmatch(value) for value in values):
+        return {'kind': 'decimal', 'values': add(np.array([int(value) for value in values], dtype=np.int64))}
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {'kind': 'str', 'values': add(np.frombuffer(b''.join(encoded), dtype=np.uint8)), 'offsets': add(offsets)}
+
+
+def decode_columns(data):
+    # The documents encode_columns turned into data, as dicts
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a snapshot object')
+    length = int.from_bytes(data[len(MAGIC):len(MAGIC) + 4], 'little')
+    position = len(MAGIC) + 4
+    header = json.loads(data[position:position + length])
+    if header['version'] != VERSION:
+        raise ValueError(f'Snapshot object of format version {header["version"]}, not {VERSION}')
+    position += length
+
+    def array(spec):
+        nonlocal position
+        dtype = np.dtype(spec[0])
+        result = np.frombuffer(data, dtype=dtype, count=spec[1], offset=position)
+        position += dtype.itemsize * spec[1]
+        return result
+
+    missing = object()
+    names, columns = [], []
+    for entry in header['columns']:
+        present = array(entry['present']) if 'present' in entry else None
+        values = _decode(entry, array)
+        if present is not None:
+            full = [missing] * header['rows']
+            for i, value in zip(np.flatnonzero(present).tolist(), values):
+                full[i] = value
+            values = full
+        names.append(entry['name'])
+        columns.append(values)
+    return [{name: value for name, value in zip(names, row) if value is not missing}
+            for row in zip(*columns)] if columns else [{} for _ in range(header['rows'])]
+
+
+def _decode(entry, array):
+    # Arrays are read in the order _encode added them
+    kind = entry['kind']
+    if kind == 'json':
+        return json.loads(array(entry['values']).tobytes())
+    if kind in ('bool', 'int', 'float'):
+        return array(entry['values']).tolist()
+    if kind == 'id':
+        keys = _decode(dict(entry, kind=entry['key_kind']), array)
+        names = [name + '/' for name in entry['collections']]
+        return [names[code] + key for code, key in zip(array(entry['codes']).tolist(), keys)]
+    if kind == 'decimal':
+        return [str(value) for value in array(entry['values']).tolist()]
+    text = array(entry['values']).tobytes()
+    offsets = array(entry['offsets']).tolist()
+    return [text[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
@@ -0,0 +1,211 @@
+import numpy as np
+
+from db_data_generators.sampling import make_rng
+
+# Kilometres per degree of latitude (and of longitude at the equator)
+KM_PER_DEGREE = 111.32
+# Queries are answered in blocks of this many points, which bounds the memory of the candidate arrays
+BLOCK = 1 << 16
+
+
+class KDTree:
+    """Points given as longitude/latitude in degrees, in a balanced KD-tree with buckets of leaf_size.
+
+    Coordinates are projected onto a plane at the mean latitude, which is accurate to a fraction of a
+    percent over a region the size of Tatarstan. The tree is implicit: node i has children 2i + 1 and
+    2i + 2, every node keeps the bounding box of its points and leaf j holds the points
+    order[starts[j]:starts[j + 1]]. Queries run on whole arrays of points: they all walk down the tree
+    together as (query, node) pairs, dropping the nodes that are too far away, so clustered data (most
+    of Streets.csv is Kazan) costs no more than evenly spread data and nothing loops over the points.
+    """
+
+    def __init__(self, longitude, latitude, leaf_size=16):
+        longitude = np.asarray(longitude, dtype=np.float64)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        self.x_scale = KM_PER_DEGREE * np.cos(np.radians(latitude.mean())) if len(latitude) else KM_PER_DEGREE
+        points = np.stack(self._project(longitude, latitude), axis=1)
+        self.depth = max(0, int(np.ceil(np.log2(max(len(points), 1) / leaf_size))))
+        self.first_leaf = (1 << self.depth) - 1
+        nodes = (1 << (self.depth + 1)) - 1
+        self.split_dimension = np.zeros(nodes, dtype=np.int8)
+        self.split = np.zeros(nodes)
+        self.low = np.full((nodes, 2), np.inf)
+        self.high = np.full((nodes, 2), -np.inf)
+        self.starts = np.zeros((1 << self.depth) + 1, dtype=np.int64)
+        self.order = np.arange(len(points))
+
+        stack = [(0, 0, len(points))]
+        while stack:
+            node, first, last = stack.pop()
+            members = points[self.order[first:last]]
+            if len(members):
+                self.low[node], self.high[node] = members.min(axis=0), members.max(axis=0)
+            if node >= self.first_leaf:
+                self.starts[node - self.first_leaf + 1] = last
+                continue
+            # Median split along the wider side
+            dimension = int(np.argmax(self.high[node] - self.low[node])) if len(members) else 0
+            middle = (first + last) // 2
+            if last - first > 1:
+                part = np.argpartition(members[:, dimension], middle - first)
+                self.order[first:last] = self.order[first:last][part]
+                self.split[node] = points[self.order[middle], dimension]
+            self.split_dimension[node] = dimension
+            stack.append((2 * node + 2, middle, last))
+            stack.append((2 * node + 1, first, middle))
+        self.points = points[self.order]
+        self.min_leaf = int(np.diff(self.starts).min())
+
+    def __len__(self):
+        return len(self.order)
+
+    def _project(self, longitude, latitude):
+        return (np.asarray(longitude, dtype=np.float64) * self.x_scale,
+                np.asarray(latitude, dtype=np.float64) * KM_PER_DEGREE)
+
+    def _leaves(self, queries, bound, k=0):
+        """(query, leaf) pairs of the leaves closer to queries[i] than bound[i].
+
+        With k, bound[i] shrinks on the way down to the farthest corner of the nearest box that holds
+        at least k points, as the k nearest points can be no farther away than that.
+        """
+        low_x, low_y, high_x, high_y = self.low[:, 0], self.low[:, 1], self.high[:, 0], self.high[:, 1]
+        bound = np.square(bound)
+        owners = np.arange(len(queries))
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        for level in range(self.depth):
+            if not len(owners):
+                break
+            owners = np.repeat(owners, 2)
+            nodes = 2 * np.repeat(nodes, 2) + 1
+            nodes[1::2] += 1
+            x, y = queries[owners, 0], queries[owners, 1]
+            below_x, above_x = low_x[nodes] - x, x - high_x[nodes]
+            below_y, above_y = low_y[nodes] - y, y - high_y[nodes]
+            if k and self.min_leaf << (self.depth - level - 1) >= k:
+                farthest = np.square(np.minimum(below_x, above_x)) + np.square(np.minimum(below_y, above_y))
+                # owners is sorted, so every query's pairs are one run
+                runs = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+                bound[owners[runs]] = np.minimum(bound[owners[runs]], np.minimum.reduceat(farthest, runs))
+            nearest = (np.square(np.maximum(np.maximum(below_x, above_x), 0))
+                       + np.square(np.maximum(np.maximum(below_y, above_y), 0)))
+            # <= keeps the nodes of points at exactly the bound, e.g. at distance 0 from the query
+            close = nearest <= bound[owners]
+            owners, nodes = owners[close], nodes[close]
+        return owners, nodes - self.first_leaf
+
+    def _points(self, owners, leaves):
+        # (owner, point) pairs of all points of the leaves
+        first, counts = self.starts[leaves], self.starts[leaves + 1] - self.starts[leaves]
+        owners = np.repeat(owners, counts)
+        positions = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, np.repeat(first, counts) + positions
+
+    def within(self, longitude, latitude, radius_km):
+        """Indices of the points within radius_km of one place, nearest first, and their distances."""
+        query = np.stack(self._project([longitude], [latitude]), axis=1)
+        _, points = self._points(*self._leaves(query, np.array([radius_km], dtype=np.float64)))
+        distances = np.hypot(*(self.points[points] - query).T)
+        inside = distances <= radius_km
+        points, distances = points[inside], distances[inside]
+        nearest = np.argsort(distances, kind='stable')
+        return self.order[points[nearest]], distances[nearest]
+
+    def nearest(self, longitude, latitude, k=1):
+        """The k points nearest to each query point: (n, k) arrays of point indices and distances in km."""
+        queries = np.stack(self._project(longitude, latitude), axis=1).reshape(-1, 2)
+        k = min(k, len(self))
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k))
+        for start in range(0, len(queries), BLOCK):
+            block = slice(start, start + BLOCK)
+            indices[block], distances[block] = self._nearest(queries[block], k)
+        return self.order[indices], distances
+
+    def _nearest(self, queries, k):
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0))
+        # The leaf each query falls into gives the distance the other leaves have to beat
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        for _ in range(self.depth):
+            dimension = self.split_dimension[nodes]
+            right = queries[np.arange(len(queries)), dimension] >= self.split[nodes]
+            nodes = 2 * nodes + 1 + right
+        own = nodes - self.first_leaf
+        owners, points = self._points(np.arange(len(queries)), own)
+        best, best_distance = _smallest(owners, points, np.hypot(*(self.points[points] - queries[owners]).T),
+                                        len(queries), k)
+
+        owners, leaves = self._leaves(queries, best_distance[:, -1], k)
+        other = leaves != own[owners]
+        owners, points = self._points(owners[other], leaves[other])
+        known = best >= 0
+        owners = np.concatenate([np.repeat(np.arange(len(queries)), known.sum(axis=1)), owners])
+        points = np.concatenate([best[known], points])
+        distance = np.hypot(*(self.points[points] - queries[owners]).T)
+        return _smallest(owners, points, distance, len(queries), k)
+
+
+def _smallest(owners, values, distances, n, k):
+    # The k values of smallest distance of every owner, -1 and inf where an owner has fewer
+    best = np.full((n, k), -1, dtype=np.int64)
+    best_distance = np.full((n, k), np.inf)
+    # One plain sort on owner + a fraction growing with the distance, much faster than np.lexsort
+    order = np.argsort(owners + distances / (distances.max() * 2 + 1) if len(owners) else owners)
+    owners, values, distances = owners[order], values[order], distances[order]
+    group_start = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]]) if len(owners) else np.zeros(0, dtype=int)
+    rank = np.arange(len(owners)) - np.repeat(group_start, np.diff(np.r_[group_start, len(owners)]))
+    keep = rank < k
+    best[owners[keep], rank[keep]] = values[keep]
+    best_distance[owners[keep], rank[keep]] = distances[keep]
+    return best, best_distance
+
+
+class Hotspots:
+    """Draws points of an index around population centres instead of evenly.
+
+    centres are (longitude, latitude, radius_km, weight). A draw picks a centre by weight and one of the
+    points within 3 * radius_km of it, weighted by a normal falloff with a standard deviation of
+    radius_km, so more people live in the centre, as many addresses there are. A share `background` of
+    the draws is spread evenly over all points. The candidates of all centres are found once, a draw is
+    a binary search in their cumulative weights.
+    """
+
+    def __init__(self, index, centres, background=0.2):
+        self.index = index
+        points, weights = [], []
+        for longitude, latitude, radius, weight in centres:
+            near, distances = index.within(longitude, latitude, radius * 3)
+            falloff = np.exp(-0.5 * np.square(distances / radius))
+            if len(near):
+                points.append(near)
+                weights.append(falloff * (weight / falloff.sum()))
+        self.points = np.concatenate(points) if points else np.zeros(0, dtype=np.int64)
+        self.cumulative = np.cumsum(np.concatenate(weights)) if weights else np.zeros(0)
+        self.background = background if len(self.points) else 1.0
+
+    @classmethod
+    def densest(cls, index, count=8, radius_km=1.0, background=0.2):
+        # Centres in the count cells of radius_km * 2 that hold the most points, weighted by their points
+        x, y = index.points.T
+        cells = (np.floor((x - x.min()) / (radius_km * 2)).astype(np.int64) * (1 << 32)
+                 + np.floor((y - y.min()) / (radius_km * 2)).astype(np.int64))
+        cells, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        top = np.argsort(counts, kind='stable')[::-1][:count]
+        centres = []
+        for cell in top:
+            members = inverse == cell
+            centres.append((x[members].mean() / index.x_scale, y[members].mean() / KM_PER_DEGREE,
+                            radius_km, counts[cell]))
+        return cls(index, centres, background)
+
+    def sample(self, n, rng=None):
+        # Indices of n points of the index, drawn with replacement
+        rng = rng if rng is not None else make_rng()
+        result = rng.integers(0, len(self.index), size=n)
+        clustered = np.flatnonzero(rng.random(n) >= self.background)
+        if len(clustered):
+            draws = rng.random(len(clustered)) * self.cumulative[-1]
+            result[clustered] = self.points[np.minimum(np.searchsorted(self.cumulative, draws, side='right'),
+                                                       len(self.points) - 1)]
+        return result
@@ -0,0 +1,137 @@
+from datetime import date
+from itertools import count
+
+import numpy as np
+
+from db_data_generators.sampling import make_rng
+
+POOL_SIZE = 5000
+POOL_SEED = 0
+EMAIL_POLICIES = ('any', 'retry', 'suffix')
+
+_pools = {}
+
+
+class ValuePool:
+    """Values generated once in bulk and handed out in an order drawn from rng, a block of indices at a time."""
+
+    def __init__(self, values, rng, block=4096):
+        self.values = values
+        self.rng = rng
+        self.block = block
+        self.ids = np.empty(0, dtype=np.int64)
+        self.pos = 0
+
+    def __call__(self):
+        if self.pos == len(self.ids):
+            self.ids = self.rng.integers(0, len(self.values), size=self.block)
+            self.pos = 0
+        value = self.values[self.ids[self.pos]]
+        self.pos += 1
+        return value
+
+    def draw(self, n):
+        return [self.values[i] for i in self.rng.integers(0, len(self.values), size=n)]
+
+
+class FakerPools:
+    """Pools of the Faker values the generators need most: texts, words, names and phone numbers.
+    Dates are not pooled, PoolDrawer.date_between draws them directly.
+
+    The pool contents only depend on seed and size, so every process builds the same pools; which values
+    a record gets is drawn from the random module (see make_rng), like the rest of a generator's choices.
+    """
+
+    def __init__(self, size=POOL_SIZE, seed=POOL_SEED):
+        from faker import Faker
+        from faker.generator import random as faker_random
+
+        state = faker_random.getstate()
+        faker_random.seed(seed)
+        fake = Faker()
+        try:
+            self.texts = [fake.text() for _ in range(size)]
+            self.words = fake.words(size)
+            self.first_names = [fake.first_name() for _ in range(size)]
+            self.last_names = [fake.last_name() for _ in range(size)]
+            self.phone_numbers = [fake.phone_number() for _ in range(size)]
+        finally:
+            faker_random.setstate(state)
+
+    def drawer(self, rng=None):
+        return PoolDrawer(self, rng if rng is not None else make_rng())
+
+
+class UniformDraw:
+    def __init__(self, rng, block=4096):
+        self.rng = rng
+        self.block = block
+        self.values = []
+        self.pos = 0
+
+    def __call__(self):
+        if self.pos == len(self.values):
+            self.values = self.rng.random(self.block).tolist()
+            self.pos = 0
+        value = self.values[self.pos]
+        self.pos += 1
+        return value
+
+
+class PoolDrawer:
+    def __init__(self, pools, rng):
+        self.random = UniformDraw(rng)
+        self._ordinals = {}
+        self.text = ValuePool(pools.texts, rng)
+        self.word = ValuePool(pools.words, rng)
+        self.first_name = ValuePool(pools.first_names, rng)
+        self.last_name = ValuePool(pools.last_names, rng)
+        self.phone_number = ValuePool(pools.phone_numbers, rng)
+        self._suffixes = count(1)
+
+    def date_between(self, start_date="-30y", end_date="today"):
+        # Same arguments as Faker's date_between, relative dates are parsed once per drawer
+        start, end = self._ordinal(start_date), self._ordinal(end_date)
+        return date.fromordinal(start + int(self.random() * (end - start + 1)))
+
+    def _ordinal(self, value):
+        if isinstance(value, date):
+            return value.toordinal()
+        ordinal = self._ordinals.get(value)
+        if ordinal is None:
+            from faker.providers.date_time import Provider as DateTimeProvider
+
+            ordinal = self._ordinals[value] = DateTimeProvider._parse_date(value).toordinal()
+        return ordinal
+
+    def email(self, taken=None, policy='retry', attempts=10, row=None):
+        """A wordword@wordword.ru address, wordword<row>@wordword.ru with the index of the row in the run.
+
+        The words have no digits, so addresses of different rows never collide, whichever process or
+        chunk generates them. taken(email) only guards against addresses already in the database: policy
+        'any' returns the first one drawn, 'retry' draws again while taken(email) is true and 'suffix'
+        does the same but falls back to a numbered address instead of giving up.
+        """
+        if policy not in EMAIL_POLICIES:
+            raise ValueError(f'Unknown email policy "{policy}", must be one of {", ".join(EMAIL_POLICIES)}')
+        w = self.word
+        number = '' if row is None else str(row)
+        for _ in range(attempts if policy != 'any' else 1):
+            email = w() + w() + number + "@" + w() + w() + ".ru"
+            if taken is None or policy == 'any' or not taken(email):
+                return email
+        if policy == 'suffix':
+            local, domain = email.split("@")
+            while True:
+                email = f'{local}{next(self._suffixes)}@{domain}'
+                if not taken(email):
+                    return email
+        raise ValueError(f'No free email address after {attempts} attempts, increase the pool size')
+
+
+def get_pools(size=POOL_SIZE, seed=POOL_SEED):
+    # Built once per process and size
+    key = (size, seed)
+    if key not in _pools:
+        _pools[key] = FakerPools(size, seed)
+    return _pools[key]
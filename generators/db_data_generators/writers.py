@@ -0,0 +1,281 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+from itertools import count
+
+import requests
+
+from db_data_generators.http_pool import ConnectionPool, json_body, request_with_retry
+from db_data_generators.records import Record, json_default
+
+BatchReport = namedtuple('BatchReport', ['collection', 'size', 'created', 'errors', 'details'])
+
+
+class Writer:
+    """Buffers documents and edges per collection and hands them to _send() in chunks of batch_size.
+
+    Every flushed chunk leaves a BatchReport in self.reports; chunks with errors are also passed to on_error.
+    """
+
+    def __init__(self, batch_size=1000, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error if on_error is not None else print_batch_errors
+        self.buffers = {}
+        self.reports = []
+        self._keys = count(int(time.time() * 1000) * 1000)
+
+    def new_key(self):
+        return str(next(self._keys))
+
+    def reset_keys(self, start):
+        # Keys assigned from now on are start, start + 1, ...
+        self._keys = count(start)
+
+    def insert(self, collection, document):
+        if '_key' not in document:
+            document['_key'] = self.new_key()
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(document)
+        if len(buffer) >= self.batch_size:
+            self.flush(collection)
+        return document['_key']
+
+    def insert_edge(self, collection, _from, _to, document=None):
+        # A Record is filled in place, a dict is copied
+        edge = document if isinstance(document, Record) else dict(document) if document else {}
+        edge['_from'] = _from
+        edge['_to'] = _to
+        return self.insert(collection, edge)
+
+    def flush(self, collection=None):
+        collections = [collection] if collection is not None else list(self.buffers)
+        for name in collections:
+            batch = self.buffers.pop(name, None)
+            if batch:
+                self._dispatch(name, batch)
+
+    def _dispatch(self, collection, batch):
+        self._report(self._send(collection, batch))
+
+    def _report(self, report):
+        self.reports.append(report)
+        if report.errors:
+            self.on_error(report)
+
+    def wait(self):
+        # Blocks until everything flushed so far is written, flush() already does for synchronous writers
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def failed(self):
+        return [report for report in self.reports if report.errors]
+
+    def _send(self, collection, batch):
+        raise NotImplementedError
+
+
+class BatchWriter(Writer):
+    """Sends chunks to ArangoDB.
+
+    mode='import' uses the bulk import endpoint (/_api/import), mode='document' uses
+    the multi-document insert (/_api/document/<collection>).
+    """
+
+    def __init__(self, url, database, username=None, password=None, batch_size=1000, mode='import',
+                 on_duplicate='error', on_error=None, session=None):
+        if mode not in ('import', 'document'):
+            raise ValueError(f'Unknown write mode "{mode}", must be "import" or "document"')
+        super().__init__(batch_size, on_error)
+        self.api_url = f'{url.rstrip("/")}/_db/{database}/_api'
+        self.mode = mode
+        self.on_duplicate = on_duplicate
+        self.session = session if session is not None else requests.Session()
+        if username is not None:
+            self.session.auth = (username, password)
+
+    def close(self):
+        super().close()
+        self.session.close()
+
+    def _send(self, collection, batch):
+        if self.mode == 'import':
+            return self._import(collection, batch)
+        return self._insert_many(collection, batch)
+
+    def _import(self, collection, batch):
+        r = self.session.post(f'{self.api_url}/import', params=import_params(collection, self.on_duplicate),
+                              data=import_payload(batch))
+        return import_report(collection, batch, r.json(), r.text)
+
+    def _insert_many(self, collection, batch):
+        r = self.session.post(f'{self.api_url}/document/{collection}', data=document_payload(batch))
+        return document_report(collection, batch, r.json(), r.text)
+
+
+class AsyncBatchWriter(Writer):
+    """Sends chunks like BatchWriter, from an asyncio event loop in a background thread.
+
+    Up to `concurrency` requests are in flight at once over as many keep-alive connections, and
+    requests failing with connection errors, timeouts or transient statuses are retried with
+    exponential backoff. flush() only blocks while all slots are taken, close() waits for every
+    request. A retry can repeat an import the server already applied; as documents keep their _key,
+    on_duplicate='ignore' makes that harmless.
+    """
+
+    def __init__(self, url, database, username=None, password=None, batch_size=1000, mode='import',
+                 on_duplicate='error', on_error=None, concurrency=8, retries=5, backoff=0.1, timeout=60):
+        if mode not in ('import', 'document'):
+            raise ValueError(f'Unknown write mode "{mode}", must be "import" or "document"')
+        super().__init__(batch_size, on_error)
+        self.api_path = f'/_db/{database}/_api'
+        self.mode = mode
+        self.on_duplicate = on_duplicate
+        self.retries = retries
+        self.backoff = backoff
+        self.pool = ConnectionPool(url, concurrency, username, password, timeout)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pending = set()
+        self._done = threading.Condition()
+        self._rng = random.Random()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-writer', daemon=True)
+        self._thread.start()
+
+    def _dispatch(self, collection, batch):
+        if self.mode == 'import':
+            path, body, params = '/import', import_payload(batch), import_params(collection, self.on_duplicate)
+        else:
+            path, body, params = f'/document/{collection}', document_payload(batch), None
+        self._slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(self._post(collection, batch, path, body, params), self._loop)
+        with self._done:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+    async def _post(self, collection, batch, path, body, params):
+        try:
+            response = await request_with_retry(self.pool, 'POST', self.api_path + path, body, params,
+                                                self.retries, self.backoff, self._rng)
+        except Exception as e:
+            return BatchReport(collection, len(batch), 0, len(batch), [f'{type(e).__name__}: {e}'])
+        text = response.body.decode('utf-8', 'replace')
+        if self.mode == 'import':
+            return import_report(collection, batch, json_body(response), text)
+        return document_report(collection, batch, json_body(response), text)
+
+    def _finished(self, future):
+        self._slots.release()
+        with self._done:
+            self._pending.discard(future)
+            self._report(future.result())
+            self._done.notify_all()
+
+    def wait(self):
+        # Blocks until every request sent so far has been answered
+        with self._done:
+            while self._pending:
+                self._done.wait()
+
+    def close(self):
+        try:
+            super().close()
+            self.wait()
+        finally:
+            if self._loop.is_running():
+                asyncio.run_coroutine_threadsafe(self.pool.close(), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+
+
+def import_params(collection, on_duplicate):
+    return {'collection': collection, 'type': 'documents', 'onDuplicate': on_duplicate, 'details': 'true'}
+
+
+def import_payload(batch):
+    return '\n'.join(json.dumps(document, default=json_default) for document in batch).encode('utf-8')
+
+
+def document_payload(batch):
+    return json.dumps(batch, default=json_default).encode('utf-8')
+
+
+def import_report(collection, batch, data, text):
+    if data.get('error'):
+        return BatchReport(collection, len(batch), 0, len(batch), [data.get('errorMessage', text)])
+    return BatchReport(collection, len(batch), data.get('created', 0), data.get('errors', 0),
+                       data.get('details', []))
+
+
+def document_report(collection, batch, data, text):
+    if isinstance(data, dict):
+        return BatchReport(collection, len(batch), 0, len(batch), [data.get('errorMessage', text)])
+    details = [f'{document["_key"]}: {result.get("errorMessage")}'
+               for document, result in zip(batch, data) if result.get('error')]
+    return BatchReport(collection, len(batch), len(batch) - len(details), len(details), details)
+
+
+class JSONLWriter(Writer):
+    """Writes every collection to <directory>/<collection>.jsonl (or .jsonl.gz), one document per line.
+
+    The files can be loaded with arangoimport --type jsonl; edges keep their _from/_to fields.
+    Writers of a parallel run each get a part name, <generator>.<first row> of their chunk, and write
+    <collection>.<part>.jsonl instead, so generators writing the same collection do not share files.
+    """
+
+    def __init__(self, directory, compress=False, batch_size=10000, on_error=None, part=None):
+        super().__init__(batch_size, on_error)
+        self.directory = directory
+        self.compress = compress
+        self.part = part
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, collection):
+        extension = '.jsonl.gz' if self.compress else '.jsonl'
+        if self.part is not None:
+            extension = f'.{self.part}{extension}'
+        return os.path.join(self.directory, collection + extension)
+
+    def close(self):
+        super().close()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def _file(self, collection):
+        f = self.files.get(collection)
+        if f is None:
+            if self.compress:
+                f = gzip.open(self.path(collection), 'wt', encoding='utf-8', compresslevel=6)
+            else:
+                f = open(self.path(collection), 'w', encoding='utf-8', buffering=1 << 20)
+            self.files[collection] = f
+        return f
+
+    def _send(self, collection, batch):
+        lines = [json.dumps(document, default=json_default, ensure_ascii=False) for document in batch]
+        lines.append('')
+        self._file(collection).write('\n'.join(lines))
+        return BatchReport(collection, len(batch), len(batch), 0, [])
+
+
+def print_batch_errors(report):
+    print(f'{report.collection}: {report.errors} of {report.size} documents were not written', file=sys.stderr)
+    for detail in report.details[:10]:
+        print(f'  {detail}', file=sys.stderr)
@@ -1,12 +1,241 @@
-from db_data_generators.generators import *
-from connector import db
+import argparse
+import os
+from functools import partial
+
+import connector
+import instrumentation
+from db_data_generators import credentials
+from db_data_generators.scale import STAGES, format_plan, make_plan, parse_counts
+
+BATCH_SIZE = 1000
+# Generators run in chunks on a process pool (None: one process per CPU); the output only depends on the seed
+SEED = 0
+PROCESSES = None
+# Keys reserved for the edges of one timetable round
+ROUND_KEYS = 10 ** 7
+
+
+def make_writer(export_dir=None, compress=False, batch_size=BATCH_SIZE, concurrency=None, snapshot=None, chunk=None):
+    # snapshot: (directory, key) of a SnapshotStore that also gets everything written
+    from db_data_generators.snapshot import SnapshotStore
+    from db_data_generators.writers import AsyncBatchWriter, BatchWriter, JSONLWriter
+
+    if snapshot is not None:
+        directory, key = snapshot
+        inner = make_writer(export_dir, compress, batch_size, concurrency, chunk=chunk)
+        return SnapshotStore(directory).writer(key, inner)
+    if export_dir is not None:
+        return JSONLWriter(export_dir, compress=compress, part=chunk)
+    if concurrency is not None:
+        return AsyncBatchWriter(*connector.settings(), batch_size=batch_size, on_duplicate='ignore',
+                                concurrency=concurrency)
+    return BatchWriter(*connector.settings(), batch_size=batch_size)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fill the clinic database with generated data.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='scale factor, 1 writes 300 staff, 10000 visitors/patients, 5000 appointments, ...')
+    parser.add_argument('--count', action='append', metavar='COLLECTION=N',
+                        help='rows of one collection regardless of the scale factor (repeatable)')
+    parser.add_argument('--only', action='append', metavar='COLLECTION', choices=[stage.name for stage in STAGES],
+                        help='generate only these collections (repeatable), the ones they reference are '
+                             'read from the database')
+    parser.add_argument('--export', metavar='DIR',
+                        help='write <collection>.jsonl files for arangoimport instead of the database')
+    parser.add_argument('--gzip', action='store_true', help='compress the exported files')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--processes', type=int, default=PROCESSES)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, metavar='N',
+                        help='keep N write requests in flight per process instead of writing one batch at a time')
+    parser.add_argument('--checkpoint', metavar='DIR',
+                        help='record finished chunks in DIR; a later run with the same seed resumes there and '
+                             'only adds the rows missing to reach the requested counts')
+    parser.add_argument('--snapshot', metavar='DIR',
+                        help='keep a binary snapshot of the generated data in DIR, keyed by seed and counts; a run '
+                             'whose snapshot is there loads it instead of generating the data again')
+    parser.add_argument('--password-policy', metavar='TEMPLATE',
+                        help='give users the password TEMPLATE formatted with their fields, e.g. "{email}", '
+                             'instead of a random one (every user gets a random salt either way)')
+    parser.add_argument('--url', help=f'ArangoDB server (default ${{CLINIC_ARANGO_URL}} or {connector.ARANGO_URL})')
+    parser.add_argument('--database', help=f'database (default ${{CLINIC_ARANGO_DATABASE}} or {connector.DB_NAME})')
+    parser.add_argument('--username', help='user name (default ${CLINIC_ARANGO_USERNAME})')
+    parser.add_argument('--password', help='password (default ${CLINIC_ARANGO_PASSWORD})')
+    parser.add_argument('--indexes', choices=('create', 'check', 'skip'), default='create',
+                        help='before writing to the database, create the indexes the generators need (or only '
+                             'report the missing ones) and flag generator queries that read whole collections')
+    parser.add_argument('--plan', action='store_true', help='print the plan and exit')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='count and time requests and validators, write them to FILE as JSON and print a summary')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='write a cProfile file per collection to DIR (profiles this process only, '
+                             'use with --processes 1 to include the generators)')
+    args = parser.parse_args(argv)
+
+    only = args.only
+    if only is None and args.export is not None:
+        # The timetable reads doctors and appointments back from the database
+        only = [stage.name for stage in STAGES if stage.name != 'timetable']
+    try:
+        args.steps = make_plan(args.scale, parse_counts(args.count), only)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.snapshot is not None:
+        if args.checkpoint is not None:
+            parser.error('--snapshot can not be combined with --checkpoint')
+        if args.only is not None:
+            parser.error('--snapshot keeps complete datasets, it can not be combined with --only')
+
+    if args.export is not None:
+        planned = {item.stage.name for item in args.steps}
+        if 'timetable' in planned:
+            parser.error('the timetable can not be exported, it needs the database')
+        for item in args.steps:
+            missing = [name for name in item.stage.requires if name not in planned]
+            if missing:
+                parser.error(f'{item.stage.name} needs {", ".join(missing)}, which can not be read from the '
+                             f'database when exporting')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(format_plan(args.steps, args.processes or os.cpu_count() or 1))
+    if args.plan:
+        return
+
+    # Imported only now, so --help and --plan start without NumPy, Faker and pyArango (benchmark.py --imports)
+    from db_data_generators.checkpoint import Checkpoint, remove_key_range
+    from db_data_generators.generators import (generate_appointments, generate_facilities, generate_home_remedies,
+                                               generate_leave_applies, generate_staff, generate_timetable,
+                                               generate_tips, generate_visitors_patients, PATIENT_POOL_FIELDS,
+                                               STAFF_POOL_FIELDS)
+    from db_data_generators.indexes import bootstrap
+    from db_data_generators.parallel import chunk_keys, generate_parallel
+    from db_data_generators.sampling import KeyPool
+    from db_data_generators.snapshot import SnapshotStore, snapshot_key
+    from validators import patient_emails, patient_refs, staff_emails, staff_refs, warm_caches
+    from connector import get_db, set_offline
+
+    connector.configure(args.url, args.database, args.username, args.password)
+
+    if args.metrics is not None:
+        instrumentation.enable()
+    credentials.set_policy(args.password_policy)
+    if args.export is not None:
+        set_offline()
+    else:
+        if args.indexes != 'skip':
+            lines, ok = bootstrap(get_db(), create=args.indexes == 'create')
+            for line in lines:
+                print(line)
+            if not ok:
+                print('Indexes are missing or queries read whole collections, the run will be slower than planned')
+        warm_caches(get_db())
+    store = SnapshotStore(args.snapshot) if args.snapshot is not None else None
+    counts = {item.stage.name: item.count for item in args.steps}
+    key = snapshot_key(args.seed, counts, password_policy=args.password_policy)
+    if store is not None and store.exists(key):
+        print(f'Loading snapshot {key} from {args.snapshot}')
+        with instrumentation.instrument_session(make_writer(args.export, args.gzip, args.batch_size,
+                                                            args.concurrency)) as writer:
+            rows = store.restore(key, writer)
+        for collection, n in rows.items():
+            print(f'{collection}: {n}')
+        failed = writer.failed
+        if failed:
+            print(f'{len(failed)} of {len(writer.reports)} batches had write errors')
+        return
+    if store is not None:
+        store.clear_staging(key)
+    writer_factory = partial(make_writer, args.export, args.gzip, args.batch_size, args.concurrency,
+                             (args.snapshot, key) if store is not None else None)
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint is not None else None
+    reports = []
+
+    def run(generator, total, *generator_args):
+        if checkpoint is not None:
+            done = min(checkpoint.rows(generator.__name__, args.seed), total)
+            print(f'{generator.__name__}: {done} of {total} rows in the checkpoint, generating {total - done}')
+        result, batch_reports = generate_parallel(generator, writer_factory, total, *generator_args,
+                                                  seed=args.seed, processes=args.processes, checkpoint=checkpoint)
+        reports.extend(batch_reports)
+        return result
+
+    def timetable(rounds):
+        with instrumentation.instrument_session(writer_factory()) as writer:
+            if checkpoint is None:
+                generate_timetable(get_db(), writer, rounds, seed=args.seed)
+            else:
+                # One round at a time, with keys of its own, so a later run continues after the last finished one
+                done = checkpoint.rows('generate_timetable', args.seed)
+                print(f'generate_timetable: {min(done, rounds)} of {rounds} rounds in the checkpoint')
+                for i in range(done, rounds):
+                    first, last = chunk_keys(args.seed, 'generate_timetable', i, 1, ROUND_KEYS)
+                    remove_key_range(get_db(), ["clinic_isAppointed"], first, last)
+                    writer.reset_keys(first)
+                    written = len(writer.reports)
+                    generate_timetable(get_db(), writer, 1, truncate=i == 0, first_round=i, seed=args.seed)
+                    writer.wait()
+                    if any(report.errors for report in writer.reports[written:]):
+                        break
+                    checkpoint.record('generate_timetable', args.seed, i, 1)
+        reports.extend(writer.reports)
+
+    # Generators that reference other collections sample keys from these pools. They come from the
+    # generators that just wrote the documents or, when those did not run, once from the database.
+    pools = {}
+
+    def staff():
+        if 'staff' not in pools:
+            pools['staff'] = KeyPool.from_db(get_db(), "clinic_Staff", STAFF_POOL_FIELDS)
+        return pools['staff']
+
+    def patients():
+        if 'visitors_patients' not in pools:
+            pools['visitors_patients'] = KeyPool.from_db(get_db(), "clinic_Patients", PATIENT_POOL_FIELDS)
+        return pools['visitors_patients']
+
+    def run_step(name, count):
+        # No chunks run for a count of 0, which leaves an empty pool rather than none
+        if name == 'staff':
+            pools['staff'] = run(generate_staff, count) or KeyPool("clinic_Staff", STAFF_POOL_FIELDS)
+        elif name == 'visitors_patients':
+            pools['visitors_patients'] = (run(generate_visitors_patients, count)
+                                          or KeyPool("clinic_Patients", PATIENT_POOL_FIELDS))
+        elif name == 'tips':
+            run(generate_tips, count)
+        elif name == 'appointments':
+            run(generate_appointments, count, patients(), staff().where("designation", "doctor"))
+        elif name == 'home_remedies':
+            run(generate_home_remedies, count)
+        elif name == 'leave_applies':
+            run(generate_leave_applies, count, staff())
+        elif name == 'facilities':
+            run(generate_facilities, count)
+        elif name == 'timetable':
+            timetable(count)
+
+    for item in args.steps:
+        with instrumentation.profile_stage(item.stage.name, args.profile):
+            run_step(item.stage.name, item.count)
+
+    failed = [report for report in reports if report.errors]
+    if failed:
+        print(f'{len(failed)} of {len(reports)} batches had write errors')
+    elif store is not None:
+        store.save(key, seed=args.seed, counts=counts)
+        print(f'Saved snapshot {key} to {args.snapshot}')
+    print(patient_emails.report())
+    print(staff_emails.report())
+    print(patient_refs.report())
+    print(staff_refs.report())
+    if args.metrics is not None:
+        print(instrumentation.metrics.summary())
+        instrumentation.metrics.dump(args.metrics)
+
 
 if __name__ == "__main__":
-    #generate_staff(db)
-    #generate_visitors_patients(db)
-    #generate_tips(db)
-    #generate_appointments(db)
-    #generate_home_remedies(db)
-    #generate_leave_applies(db)
-    generate_timetable(db)
-    #generate_facilities(db)
+    main()
@@ -0,0 +1,191 @@
+import numpy as np
+
+# Error codes, one uint8 per value
+OK = 0
+NOT_A_STRING = 1
+BAD_FORMAT = 2
+OUT_OF_RANGE = 3
+UNKNOWN = 4
+
+MESSAGES = {
+    OK: 'OK',
+    NOT_A_STRING: 'Wrong input type, must be str',
+    BAD_FORMAT: 'Wrong format',
+    OUT_OF_RANGE: 'Value out of range',
+    UNKNOWN: 'Unknown value',
+}
+
+# Values are checked in blocks of this many, which bounds the memory of the code point matrices
+BLOCK = 1 << 20
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+# The character classes of pyArango's email pattern ^[A-z0-9._-]+@[A-z0-9.-]+\.[A-z]{2,4}$ as bits
+# per ASCII code: 1 for the part before the @, 2 for the domain and 4 for the top-level domain
+_LOCAL, _DOMAIN, _TLD = np.uint8(1), np.uint8(2), np.uint8(4)
+_EMAIL_CLASSES = np.zeros(256, dtype=np.uint8)
+for _c in range(ord('A'), ord('z') + 1):
+    _EMAIL_CLASSES[_c] = _LOCAL | _DOMAIN | _TLD
+for _c in '0123456789.-':
+    _EMAIL_CLASSES[ord(_c)] = _LOCAL | _DOMAIN
+_EMAIL_CLASSES[ord('_')] |= _LOCAL
+
+
+def check_times(values):
+    """hh:mm times from 00:00 to 23:59. Returns (valid mask, error codes)."""
+    return _blocked(_check_times, values)
+
+
+def check_dates(values):
+    """YYYY-MM-DD dates that exist in the calendar. Returns (valid mask, error codes)."""
+    return _blocked(_check_dates, values)
+
+
+def check_ssns(values):
+    """123-45-6789 social security numbers; area 000, 666 and 900-999, group 00 and serial 0000 are
+    out of range as they are never issued. Returns (valid mask, error codes)."""
+    return _blocked(_check_ssns, values)
+
+
+def check_emails(values):
+    """Email addresses as val.Email accepts them. Returns (valid mask, error codes)."""
+    return _blocked(_check_emails, values)
+
+
+def check_zip_codes(values, known, streets=None, known_streets=None):
+    """Six digit zip codes (ints or strings) that appear in known, e.g. Gazetteer.zip_zip_code from
+    street_zip.csv. With streets (street ids) and known_streets (the street of every known zip code),
+    the (street, zip code) pair has to be known instead. Returns (valid mask, error codes)."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        codes = np.where((values >= 100000) & (values <= 999999), OK, BAD_FORMAT).astype(np.uint8)
+        numbers = values.astype(np.int64)
+    else:
+        valid, codes = _blocked(_check_digits, values)
+        numbers = np.zeros(len(values), dtype=np.int64)
+        numbers[valid] = np.asarray(values)[valid].astype(np.int64)
+    known = np.asarray(known, dtype=np.int64)
+    if streets is None:
+        listed = np.isin(numbers, known)
+    else:
+        listed = np.isin(np.asarray(streets, dtype=np.int64) * 1000000 + numbers,
+                         np.asarray(known_streets, dtype=np.int64) * 1000000 + known)
+    codes[(codes == OK) & ~listed] = UNKNOWN
+    return codes == OK, codes
+
+
+def messages(codes):
+    return [MESSAGES[code] for code in codes.tolist()]
+
+
+def _blocked(check, values):
+    if not isinstance(values, np.ndarray):
+        # Lists keep their non-strings, which numpy would turn into strings
+        values = np.array(values, dtype=object)
+    codes = np.empty(len(values), dtype=np.uint8)
+    for start in range(0, len(values), BLOCK):
+        codes[start:start + BLOCK] = check(values[start:start + BLOCK])
+    return codes == OK, codes
+
+
+def _codepoints(values):
+    """values as an (n, width) matrix of code points (0 past the end), plus their lengths and the
+    error codes so far (NOT_A_STRING for everything else)."""
+    codes = np.zeros(len(values), dtype=np.uint8)
+    if values.dtype.kind == 'S':
+        values = values.astype('U')
+    elif values.dtype.kind != 'U':
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+        codes[~is_str] = NOT_A_STRING
+        values = np.where(is_str, values, '').astype('U')
+    width = max(values.itemsize // 4, 1)
+    matrix = np.zeros((len(values), width), dtype=np.uint32)
+    if values.itemsize:
+        matrix[:] = np.ascontiguousarray(values).view(np.uint32).reshape(len(values), width)
+    lengths = (matrix != 0).sum(axis=1)
+    return matrix, lengths, codes
+
+
+def _fixed(values, template):
+    # Matrix of the values that have the shape of template ('d' for a digit, anything else literally)
+    matrix, lengths, codes = _codepoints(values)
+    width = len(template)
+    if matrix.shape[1] < width:
+        matrix = np.pad(matrix, ((0, 0), (0, width - matrix.shape[1])))
+    matrix = matrix[:, :width].astype(np.int32)
+    ok = lengths == width
+    for i, c in enumerate(template):
+        if c == 'd':
+            ok &= (matrix[:, i] >= 48) & (matrix[:, i] <= 57)
+        else:
+            ok &= matrix[:, i] == ord(c)
+    codes[(codes == OK) & ~ok] = BAD_FORMAT
+    return matrix - 48, codes
+
+
+def _number(digits, first, last):
+    number = np.zeros(len(digits), dtype=np.int32)
+    for i in range(first, last):
+        number = number * 10 + digits[:, i]
+    return number
+
+
+def _check_times(values):
+    digits, codes = _fixed(values, 'dd:dd')
+    in_range = (_number(digits, 0, 2) <= 23) & (_number(digits, 3, 5) <= 59)
+    codes[(codes == OK) & ~in_range] = OUT_OF_RANGE
+    return codes
+
+
+def _check_dates(values):
+    digits, codes = _fixed(values, 'dddd-dd-dd')
+    year, month, day = _number(digits, 0, 4), _number(digits, 5, 7), _number(digits, 8, 10)
+    valid_month = (month >= 1) & (month <= 12)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days = _DAYS_IN_MONTH[np.where(valid_month, month, 0)] + (leap & (month == 2))
+    in_range = (year >= 1) & valid_month & (day >= 1) & (day <= days)
+    codes[(codes == OK) & ~in_range] = OUT_OF_RANGE
+    return codes
+
+
+def _check_ssns(values):
+    digits, codes = _fixed(values, 'ddd-dd-dddd')
+    area, group, serial = _number(digits, 0, 3), _number(digits, 4, 6), _number(digits, 7, 11)
+    in_range = (area != 0) & (area != 666) & (area < 900) & (group != 0) & (serial != 0)
+    codes[(codes == OK) & ~in_range] = OUT_OF_RANGE
+    return codes
+
+
+def _check_digits(values):
+    _, codes = _fixed(values, 'dddddd')
+    return codes
+
+
+def _check_emails(values):
+    # Only a few passes over the matrix: the first character outside the local part's class and the
+    # last ones outside the domain's and the top-level domain's classes have to be the @, the @ and a dot
+    matrix, lengths, codes = _codepoints(values)
+    rows = np.arange(len(matrix))
+    # The $ of the pattern also matches before a newline that ends the value, so that one is dropped
+    newline = (lengths > 0) & (matrix[rows, np.maximum(lengths - 1, 0)] == ord('\n'))
+    matrix[rows[newline], lengths[newline] - 1] = 0
+    lengths = lengths - newline
+    ascii_only = (matrix < 128).all(axis=1)
+    matrix = matrix.astype(np.uint8)
+    classes = np.take(_EMAIL_CLASSES, matrix)
+    present = matrix != 0
+
+    at = np.argmax((classes & _LOCAL) == 0, axis=1)
+    last_not_domain = _last(((classes & _DOMAIN) == 0) & present)
+    dot = _last(((classes & _TLD) == 0) & present)
+    tld_length = lengths - dot - 1
+    ok = (ascii_only & (matrix[rows, at] == ord('@')) & (at >= 1) & (last_not_domain == at)
+          & (matrix[rows, dot] == ord('.')) & (dot > at + 1) & (tld_length >= 2) & (tld_length <= 4))
+    codes[(codes == OK) & ~ok] = BAD_FORMAT
+    return codes
+
+
+def _last(mask):
+    # Index of the last True of every row
+    return mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
@@ -1,11 +1,14 @@
-from re import search
+import re
+
+_time = re.compile(r'\d\d:\d\d')
 
 
 def time_is_valid(time):
+    # One value; input_checkers.bulk checks whole arrays
     if type(time) is not str:
         return f'Wrong input type. Time is of {type(time)}, must be str.'
 
-    if search('\d\d:\d\d', time) is None:
+    if _time.search(time) is None:
         return f'Time is of wrong format. Entered "{time}", must be "hh:mm"'
 
     return 'OK'
@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+import pyArango.validation as val
+
+# Latencies are counted in buckets of powers of two microseconds, the last one is everything above ~33s
+BUCKETS = 26
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete', 'head')
+_api_path = re.compile(r'/_api/(?P<op>[^/?]+)(/(?P<collection>[^/?]+))?')
+_aql_collection = re.compile(r'\bIN\s+(?P<collection>[A-Za-z_][\w-]*)\b')
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        microseconds = int(seconds * 1e6)
+        self.counts[min(microseconds.bit_length(), BUCKETS - 1)] += 1
+        self.calls += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th percentile, in seconds
+        rank = q * self.calls
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << i) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'calls': self.calls, 'errors': self.errors, 'total': self.total, 'max': self.max,
+                'buckets': self.counts}
+
+    def merge(self, data):
+        self.counts = [a + b for a, b in zip(self.counts, data['buckets'])]
+        self.calls += data['calls']
+        self.errors += data['errors']
+        self.total += data['total']
+        self.max = max(self.max, data['max'])
+
+
+class Metrics:
+    """Call counts and latency histograms per operation name, and bytes sent and received per
+    collection and operation. Nothing is recorded until enable() is called."""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.latencies = {}
+        self.traffic = {}
+
+    def observe(self, name, seconds, error=False):
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = Histogram()
+        histogram.observe(seconds, error)
+
+    def add_traffic(self, collection, op, sent, received):
+        key = f'{collection or "-"}/{op}'
+        traffic = self.traffic.get(key)
+        if traffic is None:
+            traffic = self.traffic[key] = {'requests': 0, 'sent': 0, 'received': 0}
+        traffic['requests'] += 1
+        traffic['sent'] += sent
+        traffic['received'] += received
+
+    def snapshot(self):
+        return {'latencies': {name: h.to_dict() for name, h in self.latencies.items()},
+                'traffic': {key: dict(traffic) for key, traffic in self.traffic.items()}}
+
+    def take(self):
+        # Snapshot and reset, for worker processes handing their numbers to the parent
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        for name, data in snapshot['latencies'].items():
+            if name not in self.latencies:
+                self.latencies[name] = Histogram()
+            self.latencies[name].merge(data)
+        for key, data in snapshot['traffic'].items():
+            traffic = self.traffic.setdefault(key, {'requests': 0, 'sent': 0, 'received': 0})
+            for field, value in data.items():
+                traffic[field] += value
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+
+    def summary(self):
+        lines = [f'{"operation":<58}{"calls":>9}{"errors":>8}{"mean ms":>9}{"p95 ms":>9}{"max ms":>9}']
+        for name, h in sorted(self.latencies.items(), key=lambda item: -item[1].total):
+            lines.append(f'{name:<58}{h.calls:>9}{h.errors:>8}{h.total / h.calls * 1e3:>9.3f}'
+                         f'{h.percentile(0.95) * 1e3:>9.3f}{h.max * 1e3:>9.3f}')
+        if self.traffic:
+            lines.append('')
+            lines.append(f'{"collection/operation":<58}{"requests":>9}{"sent KB":>10}{"recv KB":>10}')
+            for key, traffic in sorted(self.traffic.items()):
+                lines.append(f'{key:<58}{traffic["requests"]:>9}{traffic["sent"] / 1024:>10.1f}'
+                             f'{traffic["received"] / 1024:>10.1f}')
+        return '\n'.join(lines)
+
+
+metrics = Metrics()
+
+
+def timed(name, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            metrics.observe(name, time.perf_counter() - start, error=True)
+            raise
+        metrics.observe(name, time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+class InstrumentedSession:
+    """Wraps a requests.Session (or pyArango's session) and records every request in metrics."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._session, name)
+        if name not in HTTP_METHODS:
+            return attr
+
+        def request(url, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = attr(url, *args, **kwargs)
+            except Exception:
+                metrics.observe(f'http.{name}', time.perf_counter() - start, error=True)
+                raise
+            collection, op = describe_request(url, kwargs)
+            metrics.observe(f'http.{op}', time.perf_counter() - start, error=response.status_code >= 400)
+            metrics.add_traffic(collection, op, _size(kwargs.get('data')), len(response.content))
+            return response
+        return request
+
+
+def describe_request(url, kwargs):
+    # (collection, operation) of an ArangoDB REST call
+    match = _api_path.search(urlsplit(url).path)
+    if match is None:
+        return None, 'other'
+    op, collection = match.group('op'), match.group('collection')
+    params = kwargs.get('params') or {}
+    if 'collection' in params:
+        collection = params['collection']
+    elif op == 'cursor':
+        collection = None
+        data = kwargs.get('data')
+        try:
+            query = json.loads(data)
+        except (TypeError, ValueError):
+            query = None
+        if isinstance(query, dict):
+            collection = (query.get('bindVars') or {}).get('@collection')
+            if collection is None:
+                found = _aql_collection.search(query.get('query', ''))
+                collection = found.group('collection') if found else None
+    return collection, op
+
+
+def _size(data):
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    return 0
+
+
+def instrument_session(owner):
+    # owner: a pyArango Connection or a BatchWriter, anything with a session attribute
+    session = getattr(owner, 'session', None)
+    if metrics.enabled and session is not None and not isinstance(session, InstrumentedSession):
+        owner.session = InstrumentedSession(session)
+    return owner
+
+
+def instrument_validators(collection_classes):
+    for collection_class in collection_classes:
+        for field_name, field in collection_class._fields.items():
+            for validator in field.validators:
+                # Skips validators given as classes instead of instances, pyArango never calls those either
+                if isinstance(validator, val.Validator) and 'validate' not in vars(validator):
+                    name = f'validate.{collection_class.__name__}.{field_name}.{type(validator).__name__}'
+                    validator.validate = timed(name, validator.validate)
+
+
+def enable():
+    import compiled_schema
+    import connector
+    import validators
+
+    metrics.enabled = True
+    instrument_validators([validators.Tips, validators.Patients, validators.Visitors, validators.Appointments,
+                           validators.Staff, validators.LeaveApply, validators.MemberOf, validators.IsAppointed,
+                           validators.Facilities])
+    # Schemas compiled before are compiled again, with timed checks
+    compiled_schema._compiled.clear()
+    if connector._db is not None:
+        instrument_session(connector._db.connection)
+
+
+@contextmanager
+def profile_stage(name, directory=None):
+    """Runs the block under cProfile when directory is set, writing <directory>/<name>.prof and
+    printing the ten most expensive calls."""
+    if directory is None:
+        yield
+        return
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + '.prof')
+        profiler.dump_stats(path)
+        print(f'Profile of {name} written to {path}')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(10)
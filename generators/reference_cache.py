@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()
+# What lookup() returns offline for a key it can neither confirm nor rule out, see ReferenceCache
+UNKNOWN = object()
+
+
+class ReferenceCache:
+    """LRU cache of which keys exist in a collection, optionally with the value of one field (e.g. designation).
+
+    warm() loads every key with one projection scan, after which a miss no longer goes to the server as long
+    as nothing was evicted. Entries expire after ttl seconds when a ttl is given. Documents written to the
+    collection are fed in through on_write, changes made elsewhere are dropped with invalidate().
+    Keys handed to use() (the KeyPool the generators draw references from) are kept apart from the LRU
+    and never evicted. Without a database connection the cache is the only source: a miss means the key
+    does not exist as long as nothing was evicted, afterwards lookup() returns UNKNOWN instead.
+    """
+
+    def __init__(self, collection, field=None, max_size=1000000, ttl=None, clock=time.monotonic):
+        self.collection = collection
+        self.field = field
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.complete = False
+        self.evicted = False
+        self.source = None
+        self.stats = {'hits': 0, 'misses': 0, 'server_checks': 0, 'evictions': 0}
+
+    def warm(self, db_conn, batch_size=10000):
+        field = f'x.{self.field}' if self.field else 'true'
+        aql = f"FOR x IN @@collection RETURN [x._key, {field}]"
+        query = db_conn.AQLQuery(aql, rawResults=True, batchSize=batch_size, bindVars={'@collection': self.collection})
+        self.entries.clear()
+        self.complete = True
+        self.evicted = False
+        for key, value in query:
+            self.put(key, value)
+        return self
+
+    def put(self, key, value=True):
+        key = str(key)
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (value, expires)
+        self.entries.move_to_end(key)
+        if self.max_size is not None and len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+            self.complete = False
+            self.evicted = True
+
+    def use(self, keys, values=None):
+        # Keys known to exist, with their field values, looked up on a miss instead of being put()
+        self.source = ({str(key): i for i, key in enumerate(keys)}, values)
+
+    def on_write(self, document):
+        self.put(document['_key'], document.get(self.field) if self.field else True)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+            self.complete = False
+        else:
+            self.entries.pop(str(key), None)
+
+    def lookup(self, db_conn, key):
+        # Field value (True without a field) of an existing key, MISSING otherwise (or UNKNOWN, see above)
+        key = str(key)
+        entry = self.entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > self.clock()):
+            self.stats['hits'] += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        if self.source is not None:
+            i = self.source[0].get(key)
+            if i is not None:
+                self.stats['hits'] += 1
+                return self.source[1][i] if self.source[1] is not None else True
+
+        self.stats['misses'] += 1
+        if entry is None and self.complete:
+            return MISSING
+        if db_conn is None:
+            if entry is not None:
+                return entry[0]
+            return UNKNOWN if self.evicted else MISSING
+
+        self.stats['server_checks'] += 1
+        found = db_conn[self.collection].fetchFirstExample({'_key': key})
+        if not found:
+            self.put(key, MISSING)
+            return MISSING
+        value = found[0][self.field] if self.field else True
+        self.put(key, value)
+        return value
+
+    def exists(self, db_conn, key):
+        return self.lookup(db_conn, key) is not MISSING
+
+    def report(self):
+        s = self.stats
+        return (f'{self.collection} references: {s["hits"]} hits, {s["misses"]} misses, '
+                f'{s["server_checks"]} server checks, {s["evictions"]} evictions')
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The generator modules import each other from the generators directory, as generator.py runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import pyArango.validation as val
+import pytest
+
+from input_checkers.bulk import check_emails
+from validators import ValidationError
+
+EMAILS = ['carcoach0@policelocal.ru', 'a@b.cd', 'A_z.-@x-y.abcd', 'a@b.c', 'a@b.abcde', '@b.cd', 'a@.cd',
+          'a@b..cd', 'a b@c.de', 'a@b@c.de', 'ä@b.cd', 'a[@b.cd', 'a@b.cd\n', 'a@b.cd\n\n', 'a@b.cd ',
+          '\na@b.cd', 'a@b.c\n', '\n', '', 'a@b.cd\r\n']
+
+
+def email_accepts(value):
+    try:
+        val.Email().validate(value)
+    except ValidationError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('value', EMAILS)
+def test_check_emails_matches_email_validator(value):
+    valid, _ = check_emails([value])
+    assert valid[0] == email_accepts(value)
+
+
+def test_check_emails_in_one_batch():
+    valid, _ = check_emails(EMAILS)
+    assert valid.tolist() == [email_accepts(value) for value in EMAILS]
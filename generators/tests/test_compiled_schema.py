@@ -0,0 +1,16 @@
+import pytest
+
+from compiled_schema import compile_schema, validate_compiled
+from validators import InvalidDocument, Patients
+
+
+@pytest.mark.parametrize('field, value', [('address', 'Kazan'), ('address', 42),
+                                          ('security_questions', [1])])
+def test_malformed_value_is_an_error_of_its_field(field, value):
+    errors = compile_schema(Patients).validate({field: value, 'ssn': 'not an ssn'})
+    assert set(errors) == {field, 'ssn'}
+
+
+def test_malformed_address_raises_invalid_document():
+    with pytest.raises(InvalidDocument):
+        validate_compiled(Patients, {'address': 42})
@@ -0,0 +1,56 @@
+import json
+import os
+from functools import partial
+
+import pytest
+
+import connector
+from db_data_generators import generators
+from db_data_generators.generators import generate_staff, generate_visitors_patients, staff_records
+from db_data_generators.parallel import generate_parallel
+from db_data_generators.value_pools import FakerPools
+from db_data_generators.writers import JSONLWriter
+
+
+@pytest.fixture(autouse=True)
+def offline():
+    connector.set_offline()
+    yield
+    connector.set_offline(False)
+
+
+def export_writer(directory, part):
+    return JSONLWriter(directory, part=part)
+
+
+def exported_emails(directory, collection):
+    emails = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(collection + '.'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                emails.extend(json.loads(line)['email'] for line in f)
+    return emails
+
+
+@pytest.mark.parametrize('generator, total, collection', [(generate_staff, 600, 'clinic_Staff'),
+                                                          (generate_visitors_patients, 1200, 'clinic_Patients')])
+def test_emails_unique_with_any_number_of_processes(tmp_path, generator, total, collection):
+    emails = {}
+    for processes in (1, 3):
+        directory = str(tmp_path / str(processes))
+        generate_parallel(generator, partial(export_writer, directory), total, seed=7, chunk_size=100,
+                          processes=processes)
+        emails[processes] = exported_emails(directory, collection)
+        assert len(set(emails[processes])) == len(emails[processes])
+    assert emails[1] == emails[3]
+
+
+def test_emails_of_separate_chunks_never_collide(monkeypatch):
+    # Two words make 16 addresses without the row number. Every chunk runs as in a worker of its own,
+    # which knows none of the emails of the other chunks.
+    pools = FakerPools(size=2)
+    monkeypatch.setattr(generators, 'get_pools', lambda: pools)
+    monkeypatch.setattr(generators, 'staff_email_taken', lambda email: False)
+    emails = [record.data['email'] for start in (0, 100) for record in staff_records(100, start)
+              if record.collection == 'clinic_Staff']
+    assert len(set(emails)) == len(emails)
@@ -0,0 +1,75 @@
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.n_hashes)]
+
+    def add(self, value):
+        for p in self._positions(value):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+
+class UniqueIndex:
+    """Client-side index of the values a unique field already has in a collection.
+
+    With capacity=None the values are kept in a set and a hit is final. With a capacity the index is a
+    Bloom filter of bounded size and only a probable hit is confirmed on the server. Misses are only
+    trusted after load(), until then every miss is checked on the server as before.
+    """
+
+    def __init__(self, collection, field, capacity=None, error_rate=0.001):
+        self.collection = collection
+        self.field = field
+        self.values = set() if capacity is None else BloomFilter(capacity, error_rate)
+        self.exact = capacity is None
+        self.loaded = False
+        self.stats = {'hits': 0, 'misses': 0, 'server_checks': 0, 'false_positives': 0}
+
+    def load(self, db_conn, batch_size=10000):
+        aql = "FOR x IN @@collection FILTER x.@field != null RETURN x.@field"
+        bind_vars = {'@collection': self.collection, 'field': self.field}
+        for value in db_conn.AQLQuery(aql, rawResults=True, batchSize=batch_size, bindVars=bind_vars):
+            self.values.add(value)
+        self.loaded = True
+        return self
+
+    def add(self, value):
+        self.values.add(value)
+
+    def is_taken(self, db_conn, value):
+        if value in self.values:
+            self.stats['hits'] += 1
+            if self.exact or db_conn is None:
+                return True
+            if self._server_has(db_conn, value):
+                return True
+            self.stats['false_positives'] += 1
+            return False
+
+        self.stats['misses'] += 1
+        if self.loaded or db_conn is None:
+            return False
+        return self._server_has(db_conn, value)
+
+    def report(self):
+        s = self.stats
+        return (f'{self.collection}.{self.field}: {s["hits"]} hits, {s["misses"]} misses, '
+                f'{s["server_checks"]} server checks, {s["false_positives"]} false positives')
+
+    def _server_has(self, db_conn, value):
+        self.stats['server_checks'] += 1
+        query = db_conn[self.collection].fetchByExample({self.field: value}, batchSize=1, count=True)
+        return query.count != 0
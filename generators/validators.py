@@ -1,10 +1,12 @@
 import pyArango.collection as col
 import pyArango.validation as val
 import datetime
-from pyArango.theExceptions import ValidationError
+from pyArango.theExceptions import ValidationError, InvalidDocument
 from re import search
-from connector import db
+from connector import get_db
 from enumerators import *
+from unique_index import UniqueIndex
+from reference_cache import UNKNOWN, ReferenceCache
 
 
 class DatetimePastVal(val.Validator):
@@ -34,24 +36,22 @@ class DatetimeVal(val.Validator):
         return True
 
 
-class PatientEmailUniqueVal(val.Validator):
-    def validate(self, value):
-        patients = db["Patients"]
+# Generators add() every email they write. Use capacity=n for a memory-bounded Bloom filter and
+# call load() once to trust misses without asking the server.
+patient_emails = UniqueIndex("clinic_Patients", "email")
+staff_emails = UniqueIndex("clinic_Staff", "email")
 
-        query = patients.fetchByExample({'email': value}, batchSize=1, count=True)
 
-        if query.count != 0:
+class PatientEmailUniqueVal(val.Validator):
+    def validate(self, value):
+        if patient_emails.is_taken(get_db(), value):
             raise ValidationError("This email is already registered in the system")
         return True
 
 
 class StaffEmailUniqueVal(val.Validator):
     def validate(self, value):
-        staff = db["Staff"]
-
-        query = staff.fetchByExample({'email': value}, batchSize=1, count=True)
-
-        if query.count != 0:
+        if staff_emails.is_taken(get_db(), value):
             raise ValidationError("This email is already registered in the system")
         return True
 
@@ -71,12 +71,14 @@ class AddressVal(val.Validator):
                 raise ValidationError(field.capitalize(), 'is missing')
 
 
+# Existence of referenced documents; warm() them once before validating large batches
+patient_refs = ReferenceCache("clinic_Patients")
+staff_refs = ReferenceCache("clinic_Staff", "designation")
+
+
 class PatientIDExists(val.Validator):
     def validate(self, value):
-        patients = db["Patients"]
-        patient = patients.fetchFirstExample({'_key': str(value)})
-
-        if not patient:
+        if not patient_refs.exists(get_db(), value):
             raise ValidationError("Patient ID doesn't exist")
         return True
 
@@ -86,15 +88,8 @@ class DoctorIDExists(val.Validator):
         if value is None or value == "":
             return True
 
-        staff = db["Staff"]
-        member = staff.fetchFirstExample({'_key': str(value)})
-
-        if not member:
+        if staff_refs.lookup(get_db(), value) not in ("doctor", UNKNOWN):
             raise ValidationError("Doctor ID doesn't exist")
-        else:
-            member = member[0]
-            if member["designation"] != "doctor":
-                raise ValidationError("Doctor ID doesn't exist")
         return True
 
 
@@ -103,10 +98,7 @@ class StaffIDExists(val.Validator):
         if value is None or value == "":
             return True
 
-        staff = db["Staff"]
-        member = staff.fetchFirstExample({'_key': str(value)})
-
-        if not member:
+        if not staff_refs.exists(get_db(), value):
             raise ValidationError("Staff ID doesn't exist")
         return True
 
@@ -275,4 +267,26 @@ class Facilities(col.Collection):
     _fields = {
         'model': col.Field(validators=[val.NotNull()]),
         'description': col.Field(validators=[val.NotNull()])
-    }
\ No newline at end of file
+    }
+
+
+def validate_document(collection_class, document):
+    # Same checks as an on_save validation of a pyArango Document, without needing a live collection
+    errors = {}
+    for field, validator in collection_class._fields.items():
+        if field in document:
+            try:
+                validator.validate(document[field])
+            except ValidationError as e:
+                errors[field] = str(e)
+    if errors:
+        raise InvalidDocument(errors)
+    return True
+
+
+def warm_caches(db_conn):
+    # One projection scan per cache, so that validating generated records needs no further round trips
+    patient_emails.load(db_conn)
+    staff_emails.load(db_conn)
+    patient_refs.warm(db_conn)
+    staff_refs.warm(db_conn)